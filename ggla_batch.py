@@ -0,0 +1,107 @@
+import argparse
+from contextlib import redirect_stderr, redirect_stdout
+import csv
+from itertools import product
+from multiprocessing import Pool
+import os
+from ggla_height_harmony import Language
+
+
+def make_jobs(spec):  # expand a job spec into one job per pattern x seed x hyperparameter combination
+
+    seeds = spec.get('seeds', [0])
+    if isinstance(seeds, int):  # a number of seeds means seeds 0 through n - 1
+        seeds = list(range(seeds))
+
+    jobs = []
+    for pattern, rate, v_window, c_window, strength_range, seed in product(
+            spec['patterns'], spec.get('rate', [0.1]), spec.get('v_window', [0.2]), spec.get('c_window', [1]),
+            spec.get('strength_range', [(1, 20)]), seeds):
+        jobs.append({'job': len(jobs), 'pattern': pattern, 'seed': seed, 'rate': rate, 'v_window': v_window,
+                     'c_window': c_window, 'strength_min': strength_range[0], 'strength_max': strength_range[1],
+                     'engine': spec.get('engine', 'array'),
+                     'cycle_check': spec.get('cycle_check', 0), 'patience': spec.get('patience', 0)})
+
+    return jobs
+
+
+def run_job(job):  # train one learner and keep only its summary (runs inside a worker process)
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull), redirect_stderr(devnull):  # no progress bars
+        model_language = Language(new=job['pattern'], log_runs=True, seed=job['seed'],
+                                  strength_range=(job['strength_min'], job['strength_max']))  # trajectories stay here
+        if job['engine'] == 'python':
+            model_language.train_height_strength(job['rate'], job['v_window'], job['c_window'],
+                                                 cycle_check=job['cycle_check'], patience=job['patience'])
+        else:
+            model_language.train_height_strength_array(job['rate'], job['v_window'], job['c_window'],
+                                                       seed=job['seed'], cycle_check=job['cycle_check'],
+                                                       patience=job['patience'])
+
+    result = dict(job)
+    result['convergence_iteration'] = model_language.convergence_iteration
+    result['cycle_iteration'] = model_language.cycle_iteration
+    result['stop_reason'] = model_language.stop_reason
+    for segment in list(model_language.vowels.values()) + list(model_language.consonants.values()):
+        if segment.tb_upper_gest is not None:
+            result['iterations'] = segment.tb_upper_gest.strength_list.n_logged
+            result[f'cd_{segment.symbol}'] = segment.tb_upper_gest.cd  # final learner constriction degree
+            result[f'strength_{segment.symbol}'] = segment.tb_upper_gest.strength  # final learner strength
+
+    return result
+
+
+def run_batch(jobs, processes=None, output=''):  # run jobs over a process pool and collect their summaries
+
+    with Pool(processes) as pool:  # one worker per core by default
+        results = sorted(pool.imap_unordered(run_job, jobs), key=lambda result: result['job'])
+
+    if output:
+        write_results(results, output)
+
+    return results
+
+
+def write_results(results, filename):  # write summaries as one tab-delimited table (blank if no such segment)
+
+    columns = []
+    for result in results:
+        columns += [column for column in result if column not in columns]
+
+    with open(filename, 'w', newline='', encoding='utf-8') as results_file:
+        writer = csv.DictWriter(results_file, columns, delimiter='\t')
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Train many GGLA height harmony learners in parallel.')
+    parser.add_argument('patterns', nargs='+', help='pattern .json files')
+    parser.add_argument('--seeds', type=int, default=100, help='number of seeds per cell (default 100)')
+    parser.add_argument('--first-seed', type=int, default=0, help='first seed (default 0)')
+    parser.add_argument('--rate', type=float, nargs='+', default=[0.1], help='learning rate(s)')
+    parser.add_argument('--v-window', type=float, nargs='+', default=[0.2], help='vowel error window(s)')
+    parser.add_argument('--c-window', type=float, nargs='+', default=[1], help='consonant error window(s)')
+    parser.add_argument('--cycle-check', type=int, default=0,
+                        help='stop a learner whose state repeats at a multiple of this many iterations (default off)')
+    parser.add_argument('--patience', type=int, default=0,
+                        help='stop a learner whose errors have not gone down for this many iterations (default off)')
+    parser.add_argument('--engine', choices=['array', 'python'], default='array', help='training engine')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--output', default='batch_results.tsv', help='results table filename')
+    args = parser.parse_args()
+
+    jobs = make_jobs({'patterns': args.patterns,
+                      'seeds': list(range(args.first_seed, args.first_seed + args.seeds)),
+                      'rate': args.rate, 'v_window': args.v_window, 'c_window': args.c_window,
+                      'engine': args.engine, 'cycle_check': args.cycle_check, 'patience': args.patience})
+
+    print(f'Running {len(jobs)} jobs.')
+    results = run_batch(jobs, args.processes, args.output)
+    converged = sum(result['convergence_iteration'] != -1 for result in results)
+    print(f'{converged} of {len(results)} learners converged. Results saved as {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
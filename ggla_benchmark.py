@@ -0,0 +1,200 @@
+import argparse
+from contextlib import redirect_stderr, redirect_stdout
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from ggla_height_harmony import Language
+
+try:
+    import resource  # peak memory of a process (not available on Windows)
+except ImportError:
+    resource = None
+
+LOWER_IS_BETTER = ['train_s', 'convergence_s', 'save_json_s', 'save_ggla_s', 'export_s', 'load_json_s',
+                   'load_ggla_s', 'peak_rss_mb']
+HIGHER_IS_BETTER = ['it_per_s']
+TIMED_BY = {'it_per_s': 'train_s'}  # timing each rate is measured over
+
+
+def peak_rss_mb():  # highest resident memory of this process so far, in megabytes
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10  # bytes on macOS, kilobytes on Linux
+
+
+def timed(function, *args, **kwargs):  # seconds taken by one call
+
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run_case(case):  # train, save, export and load one model (runs in a fresh process so peak memory is its own)
+
+    workdir = tempfile.mkdtemp(prefix='ggla_benchmark_')
+    shutil.copy(case['pattern'], workdir)  # models and exports are written next to the pattern file
+    cwd = os.getcwd()
+    os.chdir(workdir)
+
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull), redirect_stderr(devnull):  # no progress bars
+            model_language = Language(new=os.path.basename(case['pattern']), seed=case['seed'])
+
+            start = time.perf_counter()
+            if case['engine'] == 'python':
+                model_language.train_height_strength(max_iterations=case['iterations'])
+            else:
+                model_language.train_height_strength_array(seed=case['seed'], max_iterations=case['iterations'])
+            train_s = time.perf_counter() - start
+
+            save_json_s = timed(model_language.save, check_sure=False)
+            json_name = model_language.model_name
+            save_ggla_s = timed(model_language.save, check_sure=False, binary=True)
+            ggla_name = model_language.model_name
+            export_s = timed(model_language.export_trajectories)
+            load_json_s = timed(Language, load=json_name)
+            load_ggla_s = timed(Language, load=ggla_name)
+
+        iterations = model_language.vowels[model_language.trigger[0]].tb_upper_gest.strength_list.n_logged
+        result = dict(case)
+        result.update({'convergence_iteration': model_language.convergence_iteration,
+                       'iterations_run': iterations,
+                       'train_s': train_s,
+                       'it_per_s': iterations / train_s,
+                       'convergence_s': train_s if model_language.convergence_iteration != -1 else None,
+                       'save_json_s': save_json_s,
+                       'save_ggla_s': save_ggla_s,
+                       'export_s': export_s,
+                       'load_json_s': load_json_s,
+                       'load_ggla_s': load_ggla_s,
+                       'json_mb': os.path.getsize(json_name) / 2 ** 20,
+                       'ggla_mb': os.path.getsize(ggla_name) / 2 ** 20,
+                       'peak_rss_mb': peak_rss_mb()})
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    return result
+
+
+def best_of(results):  # combine repeats of a case: fastest time and lowest memory of each metric
+
+    best = dict(results[0])
+    for metric in LOWER_IS_BETTER:
+        values = [result[metric] for result in results if result[metric] is not None]
+        best[metric] = min(values) if values else None
+    best['it_per_s'] = max(result['it_per_s'] for result in results)
+    best['repeats'] = len(results)
+
+    return best
+
+
+def run_benchmark(patterns, engines=('array', 'python'), iterations=500_000, seed=0, repeats=3, output=''):
+    # each case is run repeats times and the best of each metric is kept, since one run is too noisy to compare
+
+    context = multiprocessing.get_context('spawn')  # a new interpreter per case, so memory isn't shared or reused
+    cases = []
+    for pattern in patterns:
+        for engine in engines:
+            case = {'pattern': os.path.basename(pattern), 'engine': engine, 'iterations': iterations, 'seed': seed}
+            results = []
+            for _ in range(repeats):
+                with context.Pool(1) as pool:
+                    results.append(pool.apply(run_case, (dict(case, pattern=pattern),)))
+                    pool.close()  # let the worker exit cleanly rather than be terminated
+                    pool.join()
+            cases.append(dict(best_of(results), pattern=case['pattern']))
+
+    benchmark = {'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                 'machine': {'platform': platform.platform(), 'processor': platform.processor(),
+                             'python': platform.python_version(), 'numpy': np.__version__},
+                 'cases': cases}
+
+    if output:
+        with open(output, 'w') as benchmark_file:
+            json.dump(benchmark, benchmark_file, indent=2)
+
+    return benchmark
+
+
+def compare(benchmark, baseline, tolerance=0.1, min_seconds=0.05):
+    # print changes against a baseline and return the regressions (timings shorter than min_seconds in both, and
+    # rates measured over them, are shown but not judged: at that scale the noise is bigger than any tolerance)
+
+    baseline_cases = {(case['pattern'], case['engine'], case['iterations'], case['seed']): case
+                      for case in baseline['cases']}
+    regressions = []
+
+    print(f'{"pattern":<20}{"engine":<8}{"metric":<16}{"baseline":>12}{"current":>12}{"change":>9}')
+    for case in benchmark['cases']:
+        key = (case['pattern'], case['engine'], case['iterations'], case['seed'])
+        if key not in baseline_cases:
+            print(f'{case["pattern"]:<20}{case["engine"]:<8}(not in baseline)')
+            continue
+        old_case = baseline_cases[key]
+
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            old, new = old_case.get(metric), case.get(metric)
+            if not old or new is None:  # not measured, or didn't converge
+                continue
+            change = (new - old) / old
+            timing = TIMED_BY.get(metric, metric)
+            too_short = timing.endswith('_s') and max(old_case.get(timing) or 0, case.get(timing) or 0) < min_seconds
+            worse = not too_short and (change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance)
+            if worse:
+                regressions.append((case['pattern'], case['engine'], metric, old, new))
+            print(f'{case["pattern"]:<20}{case["engine"]:<8}{metric:<16}{old:>12.3f}{new:>12.3f}{change:>+9.1%}'
+                  f'{"  REGRESSION" if worse else "  (too short to judge)" if too_short else ""}')
+
+    return regressions
+
+
+def main():
+
+    default_patterns = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                     'pattern_files', '*.json')))
+
+    parser = argparse.ArgumentParser(description='Benchmark GGLA height harmony training, saving and loading.')
+    parser.add_argument('patterns', nargs='*', default=default_patterns,
+                        help='pattern .json files (default: all in pattern_files)')
+    parser.add_argument('--engines', nargs='+', choices=['array', 'python'], default=['array', 'python'],
+                        help='training engines to benchmark')
+    parser.add_argument('--iterations', type=int, default=500_000,
+                        help='iteration budget per learner (default 500000)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default 0)')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='runs per case; the best of each metric is kept (default 3)')
+    parser.add_argument('--output', default='benchmark.json', help='results filename')
+    parser.add_argument('--compare', default='', help='baseline results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='relative slowdown counted as a regression when comparing (default 0.1)')
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help='timings shorter than this are not judged when comparing (default 0.05)')
+    args = parser.parse_args()
+
+    benchmark = run_benchmark(args.patterns, args.engines, args.iterations, args.seed, args.repeats, args.output)
+
+    for case in benchmark['cases']:
+        print(f'{case["pattern"]:<20}{case["engine"]:<8}{case["iterations_run"]:>9} iterations '
+              f'{case["it_per_s"]:>10.0f} it/s  converged: {case["convergence_iteration"] != -1}')
+    print(f'Results saved as {args.output}.')
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(benchmark, json.load(baseline_file), args.tolerance, args.min_seconds)
+        if regressions:
+            print(f'{len(regressions)} regression(s) beyond {args.tolerance:.0%}.')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
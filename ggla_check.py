@@ -0,0 +1,140 @@
+import argparse
+from contextlib import redirect_stderr, redirect_stdout
+import glob
+import os
+import sys
+import numpy as np
+from ggla_height_harmony import Ensemble, Language, draw_trials
+
+
+class TrialStream:  # stands in for a model's rng, so train_height_strength runs a given series of array-engine trials
+
+    def __init__(self, blocks):  # blocks of trials as returned by draw_trials
+        self.trials = (trial for block in blocks for trial in zip(*block))
+        self.pending = []  # choices still to be made for the current trial
+
+    def choice(self, options):  # n_syll, then v1 (two syllables only), v2 and the consonant, as the engine asks
+
+        if not self.pending:
+            n_syll, v1, v2, c = next(self.trials)
+            self.pending = [n_syll] + ([v1] if n_syll == 2 else []) + [v2, c]
+        value = self.pending.pop(0)
+
+        return value if isinstance(options, range) else list(options)[value]
+
+
+def gestures(model_language):  # every trained gesture of a model, by symbol
+    return {s.symbol: s.tb_upper_gest for s in list(model_language.vowels.values()) +
+            list(model_language.consonants.values()) if s.tb_upper_gest is not None}
+
+
+def mismatches(expected, actual, n=None):  # gestures whose parameters (and trajectories, up to n) differ
+
+    different = []
+    for symbol, gesture in gestures(expected).items():
+        other = gestures(actual)[symbol]
+        if (gesture.cd, gesture.strength) != (other.cd, other.strength):
+            different.append(symbol)
+        elif n is not None and not (np.array_equal(gesture.cd_list.window(0, n), other.cd_list.window(0, n)) and
+                                    np.array_equal(gesture.strength_list.window(0, n),
+                                                   other.strength_list.window(0, n))):
+            different.append(symbol)
+
+    return different
+
+
+def check_engines(pattern, seed=0, iterations=200_000):
+    # the python engine and the array engine, run on the same trials, log identical trajectories
+
+    array_language = Language(new=pattern, seed=seed)
+    array_language.train_height_strength_array(seed=seed, block_size=iterations, max_iterations=iterations)
+
+    python_language = Language(new=pattern, seed=seed)
+    python_language.rng = TrialStream([draw_trials(np.random.default_rng(seed), iterations,
+                                                   len(python_language.vowels), len(python_language.consonants))])
+    python_language.train_height_strength(max_iterations=iterations)
+
+    different = mismatches(python_language, array_language, iterations)
+    if python_language.convergence_iteration != array_language.convergence_iteration:
+        different.append('convergence_iteration')
+
+    return different
+
+
+def check_ensemble(pattern, seed=0, iterations=200_000, block_size=1000):
+    # a one-learner Ensemble converges at the same iteration, with the same parameters, as the array engine, whether
+    # it trains in lockstep or on its own
+
+    array_language = Language(new=pattern, seed=seed)
+    different = []
+
+    for lockstep_min in [1, 2]:  # in lockstep, then on its own
+
+        ensemble = Ensemble(pattern, n_learners=1, seed=seed)
+        ensemble.rng = np.random.default_rng(seed)  # (its initial strengths were drawn first)
+        if lockstep_min == 1:
+            for s, symbol in enumerate(ensemble.symbols):  # same initial strengths
+                gestures(array_language)[symbol].strength = int(ensemble.strength[0, s])
+            array_language.train_height_strength_array(seed=seed, block_size=block_size, max_iterations=iterations)
+        ensemble.train_height_strength(block_size=block_size, max_iterations=iterations, lockstep_min=lockstep_min)
+
+        result = ensemble.results()[0]
+        mode = ' (lockstep)' if lockstep_min == 1 else ' (on its own)'
+        for symbol, gesture in gestures(array_language).items():
+            if (result[f'cd_{symbol}'], result[f'strength_{symbol}']) != (gesture.cd, gesture.strength):
+                different.append(symbol + mode)
+        if result['convergence_iteration'] != array_language.convergence_iteration:
+            different.append('convergence_iteration' + mode)
+
+    return different
+
+
+def check_replay(pattern, seed=0, iterations=200_000, every=50_000):
+    # trajectories re-simulated from replay checkpoints match those logged by training on the same trials
+
+    replay_language = Language(new=pattern, seed=seed, replay_every=every)
+    replay_language.train_height_strength_array(seed=seed, max_iterations=iterations)
+
+    python_language = Language(new=pattern, seed=seed)
+    python_language.rng = TrialStream([draw_trials(np.random.default_rng([seed, start]), every,
+                                                   len(python_language.vowels), len(python_language.consonants))
+                                       for start in range(0, iterations, every)])
+    python_language.train_height_strength(max_iterations=iterations)
+
+    n = next(iter(gestures(replay_language).values())).strength_list.n_logged
+    return mismatches(python_language, replay_language, n)
+
+
+CHECKS = {'engines': check_engines, 'ensemble': check_ensemble, 'replay': check_replay}
+
+
+def main():
+
+    default_patterns = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                     'pattern_files', '*.json')))
+
+    parser = argparse.ArgumentParser(description='Check that the GGLA training engines give identical results.')
+    parser.add_argument('patterns', nargs='*', default=default_patterns,
+                        help='pattern .json files (default: all in pattern_files)')
+    parser.add_argument('--checks', nargs='+', choices=list(CHECKS), default=list(CHECKS), help='checks to run')
+    parser.add_argument('--iterations', type=int, default=200_000,
+                        help='iterations compared per check (default 200000)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default 0)')
+    args = parser.parse_args()
+
+    failed = 0
+    for pattern in args.patterns:
+        for name in args.checks:
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull), redirect_stderr(devnull):
+                different = CHECKS[name](pattern, args.seed, args.iterations)
+            failed += bool(different)
+            outcome = 'differs: ' + ', '.join(different) if different else 'ok'
+            print(f'{os.path.basename(pattern):<20}{name:<10}{outcome}')
+
+    if failed:
+        print(f'{failed} check(s) failed.')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,8 @@
+from array import array
+from bisect import bisect_right
 from copy import deepcopy
+import csv
+from functools import partial
 import json
 import math
 import matplotlib.pyplot as plt
@@ -6,8 +10,13 @@ import matplotlib.pylab as pl
 import numpy as np
 import os.path
 import random
+import shutil
+import tempfile
+import time
 from tqdm import tqdm
 
+STOPPED = {'cycle': 'cycle detected', 'patience': 'errors stopped going down'}  # how early stops are reported
+
 
 class Segment:  # Segment object class made up of attributes from Gesture object class
 
@@ -27,30 +36,31 @@ class Segment:  # Segment object class made up of attributes from Gesture object
     def delete_gest(self, gest_type):  # not needed for anything here--maybe later
         setattr(self, gest_type, None)
 
-    def dict(self):  # make Segment object json serializable
+    def dict(self, arrays=None):  # make Segment object json serializable
 
-        seg_dict = deepcopy(self.__dict__)
+        seg_dict = dict(self.__dict__)  # shallow copy (gestures are serialized below without copying trajectories)
 
         for item in seg_dict:
             if isinstance(seg_dict[item], Gesture):
-                seg_dict[item] = deepcopy(seg_dict[item].__dict__)
+                seg_dict[item] = seg_dict[item].dict(arrays)
 
         return seg_dict
 
 
 class Gesture:  # Gesture object class with attributes for learner and teacher
 
-    def __init__(self, cl, cd):
+    def __init__(self, cl, cd, rng=random, strength_range=(1, 20)):
+        # rng: random number generator for the initial strength, drawn from strength_range (inclusive)
         self.cl = cl  # gesture's constriction location being learned by learner (not currently implemented)
         self.cl_teacher = cl  # gesture's constriction location to be learned from teacher (not currently implemented)
         self.cl_list = []  # gesture's constriction location series (not currently implemented)
 
         self.cd = 16  # gesture's constriction degree being learned by learner (initialized as /a/)
         self.cd_teacher = cd  # gesture's constriction degree to be learned from teacher
-        self.cd_list = []  # gesture's constriction degree series (logged throughout training)
+        self.cd_list = Trajectory()  # gesture's constriction degree series (logged throughout training)
 
-        self.strength = random.randint(1, 20)  # gesture's strength (randomly initialized)
-        self.strength_list = []  # gesture's strength series (logged throughout training)
+        self.strength = rng.randint(*strength_range)  # gesture's strength (randomly initialized)
+        self.strength_list = Trajectory()  # gesture's strength series (logged throughout training)
 
     def update_cl(self, rate):  # not currently implemented
         pass
@@ -63,35 +73,531 @@ class Gesture:  # Gesture object class with attributes for learner and teacher
             self.cd = round(self.cd + rate, 2)  # ...update the constriction degree according to rate
 
     def log_cd(self):  # keep track of gesture's constriction degree values throughout training
-        self.cd_list.append(round(self.cd, 2))
+        self.cd_list.append(self.cd)
 
     def update_strength(self, rate):  # update gesture's strength during training
         if self.strength + rate >= 1:  # as long as strength isn't going below 1...
             self.strength = round(self.strength + rate, 2)  # ...update the strength according to rate
 
     def log_strength(self):  # keep track of gesture's strength values throughout training
-        self.strength_list.append(round(self.strength, 2))
+        self.strength_list.append(self.strength)
+
+    def dict(self, arrays=None):  # make Gesture object json serializable
+
+        gest_dict = {}
+
+        for attrib, value in self.__dict__.items():
+            if isinstance(value, Trajectory):
+                gest_dict[attrib] = value.dict(arrays)  # serialize Trajectory
+            else:
+                gest_dict[attrib] = deepcopy(value)
+
+        return gest_dict
+
+
+class Trajectory:  # compact series of a gesture's logged values, stored as integer hundredths in typed arrays
+
+    def __init__(self, every=1, runs=False):
+        self.every = every  # keep one logged value every this many iterations
+        self.runs = runs  # store runs of repeated values once (run-length encoding) instead of every value
+        self.n_logged = 0  # number of iterations logged (including the ones skipped by decimation)
+        self.hundredths = array('i')  # kept values in hundredths (one per run if run-length encoded)
+        self.run_lengths = array('i')  # number of kept values in each run (run-length encoding only)
+        # (values and lengths are read-only numpy memory maps instead for trajectories loaded lazily)
+
+    def materialize(self):  # copy memory-mapped values into memory so more iterations can be logged
+        if not isinstance(self.hundredths, array):
+            self.hundredths = array('i', self.hundredths.tobytes())
+            self.run_lengths = array('i', self.run_lengths.tobytes())
+
+    def append(self, value):  # log one iteration (materialize() first if the trajectory was loaded lazily)
+
+        self.n_logged += 1
+        if self.every != 1 and (self.n_logged - 1) % self.every:  # decimated away
+            return
+
+        value = round(value * 100)  # values are rounded to 2 decimals, so hundredths are exact
+        if not self.runs:
+            self.hundredths.append(value)
+        elif self.hundredths and self.hundredths[-1] == value:  # same value as the current run...
+            self.run_lengths[-1] += 1  # ...so just lengthen it
+        else:
+            self.hundredths.append(value)
+            self.run_lengths.append(1)
+
+    def extend(self, values):  # log many iterations at once
+
+        self.materialize()
+        values = np.rint(np.asarray(values, dtype=float) * 100).astype(np.intc)
+        first = -self.n_logged % self.every  # position of the first of these iterations that is kept
+        self.n_logged += len(values)
+        values = values[first::self.every]
+
+        if not len(values):
+            return
+        if not self.runs:
+            self.hundredths.frombytes(values.tobytes())
+            return
+
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(values)) + 1))  # where each run of values begins
+        run_values = values[starts]
+        run_lengths = np.diff(np.append(starts, len(values))).astype(np.intc)
+        if self.hundredths and self.hundredths[-1] == run_values[0]:  # first run continues the current run
+            self.run_lengths[-1] += int(run_lengths[0])
+            run_values = run_values[1:]
+            run_lengths = run_lengths[1:]
+        self.hundredths.frombytes(run_values.tobytes())
+        self.run_lengths.frombytes(run_lengths.tobytes())
+
+    def window(self, start, stop):  # kept values start through stop - 1 as an array of floats
+
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if stop <= start:
+            return np.zeros(0)
+
+        values = np.frombuffer(self.hundredths, dtype=np.intc)
+        if self.runs:  # only expand the runs that overlap the window
+            ends = np.cumsum(np.frombuffer(self.run_lengths, dtype=np.intc), dtype=np.int64)
+            first = np.searchsorted(ends, start, side='right')
+            last = np.searchsorted(ends, stop - 1, side='right')
+            lengths = np.diff(np.concatenate(([start], ends[first:last], [stop])))
+            values = np.repeat(values[first:last + 1], lengths)
+        else:
+            values = values[start:stop]
+
+        return values / 100
+
+    def tolist(self):
+        return self.window(0, len(self)).tolist()
+
+    def dict(self, arrays=None):  # make Trajectory json serializable (a plain list if nothing is decimated or encoded)
+
+        if arrays is not None:  # binary models: the typed arrays are written as they are and referenced by number
+            arrays += [self.hundredths, self.run_lengths]
+            return {'every': self.every, 'runs': self.runs, 'n_logged': self.n_logged,
+                    'values': {'array': len(arrays) - 2}, 'lengths': {'array': len(arrays) - 1}}
+
+        if self.every == 1 and not self.runs:
+            return self.tolist()
+
+        return {'every': self.every, 'runs': self.runs, 'n_logged': self.n_logged,
+                'values': self.hundredths.tolist(), 'lengths': self.run_lengths.tolist()}
+
+    def __len__(self):  # number of kept values
+        return -(-self.n_logged // self.every)
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step < 0:
+                return self.tolist()[index]
+            return self.window(start, stop)[::step].tolist()
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('trajectory index out of range')
+
+        return self.window(index, index + 1)[0].item()
+
+    def blocks(self, start, stop, size=65536):  # kept values start through stop - 1, in consecutive arrays of up to size
+        start, stop, _ = slice(start, stop).indices(len(self))
+        for first in range(start, stop, size):
+            yield self.window(first, min(first + size, stop))
+
+    def __iter__(self):  # iterate in chunks so the whole trajectory is never expanded at once
+        for values in self.blocks(0, len(self)):
+            yield from values.tolist()
+
+    def __array__(self, dtype=None, copy=None):
+        return self.window(0, len(self)).astype(dtype if dtype is not None else float)
+
+
+class ReplayTrajectory(Trajectory):  # trajectory that is re-simulated from replay checkpoints instead of stored
+
+    def __init__(self, replay=None, segment=0, parameter='cd'):
+        super().__init__()
+        self.replay = replay  # the model's Replay
+        self.segment = segment  # segment index in the compiled inventory
+        self.parameter = parameter  # 'cd' or 'strength'
+
+    def materialize(self):  # nothing is stored
+        pass
+
+    def append(self, value):  # count one iteration
+        self.n_logged += 1
+
+    def extend(self, values):  # count many iterations
+        self.n_logged += len(values)
+
+    def window(self, start, stop):
+        return np.concatenate([np.zeros(0)] + list(self.blocks(start, stop)))
+
+    def blocks(self, start, stop, size=65536):  # split at checkpoints too, so each block is re-simulated only once
+        start, stop, _ = slice(start, stop).indices(len(self))
+        for values in self.replay.blocks(start, stop, self.parameter, self.segment):
+            for first in range(0, len(values), size):
+                yield values[first:first + size]
+
+    def dict(self, arrays=None):  # only the number of iterations (the model's checkpoints are saved with it)
+        return {'replay': True, 'n_logged': self.n_logged}
+
+
+class Replay:  # seeds and sparse checkpoints from which any window of training can be re-simulated
+
+    def __init__(self, inventory, every=100_000, checkpoints=None):
+        self.inventory = inventory  # compiled inventory and pattern (Language.compile_inventory)
+        self.every = every  # iterations between checkpoints (each block of trials starts at one)
+        self.checkpoints = checkpoints if checkpoints is not None else []  # in order of iteration
+        self.cached = None  # change logs of the last block re-simulated, as (checkpoint, trials, (cd, strength))
+
+    def checkpoint(self, iteration, cd, strength, seed, rate, v_window, c_window, fixed_point=False):
+        # record the state before a block (in integer hundredths, as are rate and windows, if fixed_point)
+
+        if self.checkpoints and self.checkpoints[-1]['iteration'] == iteration:  # a call that ran no trials
+            self.checkpoints.pop()
+        self.checkpoints.append({'iteration': iteration, 'cd': cd[:], 'strength': strength[:], 'seed': seed,
+                                 'rate': rate, 'v_window': v_window, 'c_window': c_window,
+                                 'fixed_point': fixed_point})
+        self.cached = None
+
+    def blocks(self, start, stop, parameter, segment):
+        # one segment's cd or strength for iterations start through stop - 1, one checkpoint block at a time
+
+        iterations = [checkpoint['iteration'] for checkpoint in self.checkpoints]
+        k = bisect_right(iterations, start) - 1  # last checkpoint at or before start
+
+        while k < len(self.checkpoints) and iterations[k] < stop:
+            checkpoint = self.checkpoints[k]
+            end = min(stop, iterations[k + 1]) if k + 1 < len(iterations) else stop
+            n = end - checkpoint['iteration']
+            cd_changes, strength_changes = self.simulate(k, n)
+            trials, changes = (cd_changes if parameter == 'cd' else strength_changes)[segment]
+            cut = bisect_right(trials, n)  # (the block may have been re-simulated further)
+            values = expand_changes(checkpoint[parameter][segment], (trials[:cut], changes[:cut]), n)
+            first = max(start, checkpoint['iteration']) - checkpoint['iteration']  # skip trials before start
+            yield values[first:] / 100 if checkpoint.get('fixed_point', False) else values[first:]
+            k += 1
+
+    def simulate(self, k, n):  # cd and strength change logs of the first n trials of checkpoint k's block
+
+        if self.cached is not None and self.cached[0] == k and self.cached[1] >= n:  # (trials past n are ignored)
+            return self.cached[2]
+
+        checkpoint = self.checkpoints[k]
+        fixed_point = checkpoint.get('fixed_point', False)
+        inventory = {key: self.inventory[key].tolist() for key in ['cd_teacher', 'harmony_target', 'trigger',
+                                                                   'consonant_segment']}
+        if fixed_point:
+            inventory.update(cd_teacher=hundredths(self.inventory['cd_teacher']).tolist(),
+                             harmony_target=hundredths(self.inventory['harmony_target']).tolist())
+        trials = draw_trials(np.random.default_rng([checkpoint['seed'], checkpoint['iteration']]), self.every,
+                             self.inventory['n_vowels'], self.inventory['n_consonants'],
+                             lexicon=self.inventory.get('lexicon'))
+        changes = ([([], []) for _ in checkpoint['cd']], [([], []) for _ in checkpoint['cd']])
+        (run_trials_fixed if fixed_point else run_trials)(
+            [column[:n] for column in trials], checkpoint['cd'][:], checkpoint['strength'][:], inventory,
+            checkpoint['rate'], checkpoint['v_window'], checkpoint['c_window'], changes=changes)
+        self.cached = (k, n, changes)
+
+        return changes
+
+    def dict(self):  # make Replay json serializable (the inventory is compiled again when loading)
+        return {'every': self.every, 'checkpoints': deepcopy(self.checkpoints)}
+
+
+class ErrorTable:  # persistent table of every constraint checked by Language.check_convergence
+
+    def __init__(self, cd, strength, cd_teacher, harmony_target, trigger, dorsals, n_vowels, v_window=0.2,
+                 c_window=1, symbols=None):
+        self.symbols = symbols  # segment symbols by segment index
+        self.cd = cd  # learner constriction degrees by segment index (shared with the trainer, vowels first)
+        self.strength = strength  # learner strengths by segment index (shared with the trainer)
+        self.cd_teacher = cd_teacher  # teacher constriction degrees by segment index
+        self.harmony_target = harmony_target  # teacher cd of each vowel as v1 before a harmony trigger
+        self.triggers = [v for v in range(n_vowels) if trigger[v]]  # vowel indices of harmony triggers
+        self.dorsals = dorsals  # segment indices of dorsal consonants
+        self.n_vowels = n_vowels
+        self.v_window = v_window
+        self.c_window = c_window
+
+        self.cv_errors = {c: [False] * n_vowels for c in dorsals}  # consonant error for each CV sequence
+        self.v_errors = [False] * n_vowels  # vowel error for each vowel surfacing faithfully
+        self.harmony_errors = {t: [False] * n_vowels for t in self.triggers}  # harmony error for each v1-trigger
+        self.n_errors = 0  # number of violated constraints (the model has converged when this is 0)
+
+        self.update(list(range(n_vowels)) + dorsals)  # evaluate every constraint once
+
+    def update(self, segments):  # re-evaluate only the constraints involving segments whose parameters changed
+
+        cd = self.cd
+        strength = self.strength
+        cd_teacher = self.cd_teacher
+        harmony_target = self.harmony_target
+        v_window = self.v_window
+        c_window = self.c_window
+        vowels = range(self.n_vowels)
+        n_errors = self.n_errors
+
+        for s in set(segments):
+            if s < 0:  # non-dorsal consonant
+                continue
+
+            if s in self.cv_errors:  # dorsal consonant: re-check its CV sequences with every vowel
+                row = self.cv_errors[s]
+                for v in vowels:
+                    output_c = ((cd[s] * strength[s]) + (cd[v] * strength[v])) / (strength[s] + strength[v])
+                    error = abs(output_c - cd_teacher[s]) >= c_window
+                    n_errors += error - row[v]
+                    row[v] = error
+                continue
+
+            for c, row in self.cv_errors.items():  # vowel: re-check every CV sequence it is in...
+                output_c = ((cd[c] * strength[c]) + (cd[s] * strength[s])) / (strength[c] + strength[s])
+                error = abs(output_c - cd_teacher[c]) >= c_window
+                n_errors += error - row[s]
+                row[s] = error
+
+            error = abs(cd[s] - cd_teacher[s]) >= v_window  # ...its faithful surface form...
+            n_errors += error - self.v_errors[s]
+            self.v_errors[s] = error
+
+            for t, row in self.harmony_errors.items():  # ...every harmony sequence it is v1 in...
+                output_v1 = ((cd[s] * strength[s]) + (cd[t] * strength[t])) / (strength[s] + strength[t])
+                error = abs(output_v1 - harmony_target[s]) >= v_window
+                n_errors += error - row[s]
+                row[s] = error
+
+            if s in self.harmony_errors:  # ...and every harmony sequence it triggers
+                row = self.harmony_errors[s]
+                for v1 in vowels:
+                    output_v1 = ((cd[v1] * strength[v1]) + (cd[s] * strength[s])) / (strength[v1] + strength[s])
+                    error = abs(output_v1 - harmony_target[v1]) >= v_window
+                    n_errors += error - row[v1]
+                    row[v1] = error
+
+        self.n_errors = n_errors
+
+    def converged(self):
+        return self.n_errors == 0
+
+
+class FixedErrorTable(ErrorTable):  # ErrorTable for parameters in integer hundredths, with no division or rounding
+
+    def update(self, segments):
+        # blended cd is (cd1 * s1 + cd2 * s2) / (s1 + s2), and strengths are positive, so
+        # |blended - target| >= window  <=>  |cd1 * s1 + cd2 * s2 - target * (s1 + s2)| >= window * (s1 + s2)
+
+        cd = self.cd
+        strength = self.strength
+        cd_teacher = self.cd_teacher
+        harmony_target = self.harmony_target
+        v_window = self.v_window
+        c_window = self.c_window
+        vowels = range(self.n_vowels)
+        n_errors = self.n_errors
+
+        for s in set(segments):
+            if s < 0:  # non-dorsal consonant
+                continue
+
+            if s in self.cv_errors:  # dorsal consonant: re-check its CV sequences with every vowel
+                row = self.cv_errors[s]
+                for v in vowels:
+                    total = strength[s] + strength[v]
+                    error = abs(cd[s] * strength[s] + cd[v] * strength[v] - cd_teacher[s] * total) >= c_window * total
+                    n_errors += error - row[v]
+                    row[v] = error
+                continue
+
+            for c, row in self.cv_errors.items():  # vowel: re-check every CV sequence it is in...
+                total = strength[c] + strength[s]
+                error = abs(cd[c] * strength[c] + cd[s] * strength[s] - cd_teacher[c] * total) >= c_window * total
+                n_errors += error - row[s]
+                row[s] = error
+
+            error = abs(cd[s] - cd_teacher[s]) >= v_window  # ...its faithful surface form...
+            n_errors += error - self.v_errors[s]
+            self.v_errors[s] = error
+
+            for t, row in self.harmony_errors.items():  # ...every harmony sequence it is v1 in...
+                total = strength[s] + strength[t]
+                error = abs(cd[s] * strength[s] + cd[t] * strength[t] - harmony_target[s] * total) >= v_window * total
+                n_errors += error - row[s]
+                row[s] = error
+
+            if s in self.harmony_errors:  # ...and every harmony sequence it triggers
+                row = self.harmony_errors[s]
+                for v1 in vowels:
+                    total = strength[v1] + strength[s]
+                    error = abs(cd[v1] * strength[v1] + cd[s] * strength[s] - harmony_target[v1] * total) >= \
+                        v_window * total
+                    n_errors += error - row[v1]
+                    row[v1] = error
+
+        self.n_errors = n_errors
+
+
+class CycleDetector:  # spots training runs that are stuck and will never converge, so they can stop early
+
+    def __init__(self, cycle_check=0, patience=0):
+        self.cycle_check = cycle_check  # record the learner's (rounded) state every this many iterations (0 = never)
+        self.patience = patience  # give up after this many iterations without fewer errors (0 = never)
+        self.states = {}  # hash of each recorded state -> iteration it was first recorded at
+        self.best_errors = None  # fewest errors so far...
+        self.best_iteration = 0  # ...and the iteration they were reached at
+        self.stopped = ''  # which check stopped training ('cycle' or 'patience')
+
+    def check(self, it, table):  # why training should stop at iteration it ('' to keep training)
+
+        if self.patience:
+            if self.best_errors is None or table.n_errors < self.best_errors:
+                self.best_errors = table.n_errors
+                self.best_iteration = it
+            elif it - self.best_iteration >= self.patience:
+                self.stopped = 'patience'
+                return f'no fewer than {self.best_errors} errors for {self.patience} iterations'
+
+        if self.cycle_check and it % self.cycle_check == 0:
+            # parameters are rounded, so states can repeat exactly (only their hashes are kept, so memory stays small)
+            state = hash(tuple(table.cd) + tuple(table.strength))
+            if state in self.states:
+                self.stopped = 'cycle'
+                return f'state repeats iteration {self.states[state]}'
+            self.states[state] = it
+
+        return ''
+
+
+class Telemetry:  # throttled progress bar, periodic callbacks and optional timing of each part of a training loop
+
+    def __init__(self, report_every=10_000, callback=None, profile=False):
+        self.report_every = report_every  # update the progress bar and call back every this many iterations
+        self.callback = callback  # called with a dictionary of iteration, errors, it_per_s and elapsed
+        self.profile = {} if profile else None  # section of the training loop -> seconds spent in it
+        self.progress = tqdm()  # initialize progress bar
+        self.start_time = time.perf_counter()
+        self.lap_time = self.start_time  # end of the last timed section
+        self.next_report = report_every  # iterations (this call) at which to report next
+        self.reported = 0  # iterations (this call) already added to the progress bar
+
+    def lap(self, section):  # add the time since the last lap to a section of the training loop
+        now = time.perf_counter()
+        self.profile[section] = self.profile.get(section, 0) + now - self.lap_time
+        self.lap_time = now
+
+    def report(self, it, iteration, table):  # it: iterations run this call, iteration: iterations logged in total
+
+        elapsed = time.perf_counter() - self.start_time
+        self.progress.update(it - self.reported)
+        self.reported = it
+        self.next_report = it + self.report_every
+
+        if self.callback is not None:
+            self.callback({'iteration': iteration, 'errors': table.n_errors, 'it_per_s': it / elapsed if elapsed else 0,
+                           'elapsed': elapsed})
+
+    def close(self, it, iteration, table):  # final report, and a breakdown of where the time went if profiling
+
+        self.report(it, iteration, table)
+        self.progress.close()
+
+        if self.profile is not None:
+            total = sum(self.profile.values())
+            for section, seconds in self.profile.items():
+                print(f'{section:<12}{seconds:8.2f} s {100 * seconds / total:5.1f}%')
+
+
+class Lexicon:  # word shapes (consonant, v1, v2) weighted by frequency, drawn in O(1) each from alias tables
+
+    def __init__(self, shapes, vowels, consonants, filename=''):
+        # shapes: [consonant, v1, v2, count] rows (v1 '' for monosyllables), vowels, consonants: the model's Segments
+        self.filename = filename  # frequency file the shapes were read from
+        self.shapes = [list(shape) for shape in shapes]
+
+        vowel_index = {v: i for i, v in enumerate(vowels)}
+        consonant_index = {c: i for i, c in enumerate(consonants)}
+        for c, v1, v2, count in self.shapes:
+            if c not in consonant_index or v2 not in vowel_index or (v1 and v1 not in vowel_index):
+                raise ValueError(f'word shape {c} {v1} {v2} uses a segment that is not in the inventory')
+            if count < 0:
+                raise ValueError(f'word shape {c} {v1} {v2} has a negative count')
+        counts = [shape[3] for shape in self.shapes]
+        if not sum(counts):
+            raise ValueError('the lexicon has no words')
+
+        # each shape as indices (vowel and consonant order of the inventory) for the array engines...
+        self.n_sylls = np.array([2 if v1 else 1 for _, v1, _, _ in self.shapes], dtype=np.int64)
+        self.v1s = np.array([vowel_index[v1] if v1 else 0 for _, v1, _, _ in self.shapes], dtype=np.int64)
+        self.v2s = np.array([vowel_index[v2] for _, _, v2, _ in self.shapes], dtype=np.int64)
+        self.cs = np.array([consonant_index[c] for c, _, _, _ in self.shapes], dtype=np.int64)
+        # ...and as Segments for the python engine
+        self.segments = [(2 if v1 else 1, vowels[v1] if v1 else None, vowels[v2], consonants[c])
+                         for c, v1, v2, _ in self.shapes]
+
+        self.prob, self.alias = alias_table(counts)  # keep shape i with probability prob[i], else take alias[i]
+        self.prob_list = self.prob.tolist()
+        self.alias_list = self.alias.tolist()
+
+    def sample(self, rng):  # one trial as (n_syll, v1, v2, consonant) Segments, from a random.Random
+
+        i = rng.randrange(len(self.segments))
+        if rng.random() >= self.prob_list[i]:
+            i = self.alias_list[i]
+        return self.segments[i]
+
+    def draw(self, rng, size):  # trials of any shape as n_syll, v1, v2 and consonant index arrays, from a Generator
+
+        i = rng.integers(0, len(self.shapes), size)
+        i = np.where(rng.random(size) < self.prob[i], i, self.alias[i])
+        return self.n_sylls[i], self.v1s[i], self.v2s[i], self.cs[i]
+
+    def dict(self):  # make Lexicon json serializable (its alias tables are rebuilt when loading)
+        return {'filename': self.filename, 'shapes': deepcopy(self.shapes)}
 
 
 class Language:  # class of objects that define a vowel inventory and a height harmony grammar
 
-    def __init__(self, new='', load=''):
+    def __init__(self, new='', load='', log_every=1, log_runs=False, lazy=False, seed=None, replay_every=0,
+                 strength_range=(1, 20), lexicon=''):
 
         if load:
             print(f'Loading {load}.')
-            with open(load) as jsonfile:
-                model_dict = json.load(jsonfile)  # imported model as dictionary from .json file
+            if load.endswith('.ggla'):
+                model_dict = read_model(load, lazy)  # imported model (trajectories memory-mapped if lazy)
+            else:
+                with open(load) as jsonfile:
+                    model_dict = json.load(jsonfile)  # imported model as dictionary from .json file
 
             self.pattern_name = model_dict['pattern_name']
             self.model_name = model_dict['model_name']
+            self.seed = model_dict.get('seed')  # (None for models saved before seeds were recorded)
+            self.strength_range = model_dict.get('strength_range', [1, 20])
+            self.rng = random.Random(self.seed)
+            if 'rng' in model_dict:  # pick up the random number generator where training left off
+                version, state, gauss_next = model_dict['rng']
+                self.rng.setstate((version, tuple(state), gauss_next))
             self.pattern = model_dict['pattern']
             self.trigger = model_dict['trigger']
             self.vowels = self.initialize_vowels(model_dict['vowels'])
             self.consonants = self.initialize_consonants(model_dict['consonants'])
             self.convergence_iteration = model_dict['convergence_iteration']
+            self.cycle_iteration = model_dict.get('cycle_iteration', -1)
+            self.stop_reason = model_dict.get('stop_reason', 'cycle' if self.cycle_iteration != -1 else '')
+            self.replay = None
+            self.lexicon = None
+            if model_dict.get('lexicon'):  # trained on word shapes weighted by frequency
+                self.lexicon = Lexicon(model_dict['lexicon']['shapes'], self.vowels, self.consonants,
+                                       model_dict['lexicon']['filename'])
+            if model_dict.get('replay'):  # trajectories are replayed from checkpoints
+                self.set_replay(model_dict['replay']['every'], model_dict['replay']['checkpoints'])
         elif new:
             self.pattern_name = new  # filename for language pattern dictionary from .json file
             self.model_name = ''  # filename for language model .json file
+            self.seed = seed if seed is not None else random.getrandbits(32)  # every model records its seed...
+            self.rng = random.Random(self.seed)  # ...for initial strengths and training trials, so runs can be rerun
+            self.strength_range = list(strength_range)  # lowest and highest initial strength of every gesture
 
             with open(new) as jsonfile:
                 self.pattern = json.load(jsonfile)  # imported harmony pattern as dictionary from .json file
@@ -100,9 +606,45 @@ class Language:  # class of objects that define a vowel inventory and a height h
             self.vowels = self.initialize_vowels()  # create dictionary of all vowels in inventory
             self.consonants = self.initialize_consonants()  # create dictionary of all consonants in inventory
             self.convergence_iteration = -1  # at what iteration does model converge (-1 means no convergence yet)
+            self.cycle_iteration = -1  # at what iteration was training stopped early as stuck (-1 means never)
+            self.stop_reason = ''  # why it was stopped early ('cycle' or 'patience')
+            self.set_logging(log_every, log_runs)  # how gestures' trajectories are logged during training
+            self.lexicon = None  # training trials are drawn uniformly unless a lexicon is set
+            if lexicon:
+                self.set_lexicon(lexicon)  # draw training trials by word frequency
+            if replay_every:
+                self.set_replay(replay_every)  # replay trajectories from checkpoints instead of storing them
         else:
             print('Enter either a model filename to load a trained model or a pattern filename to train a new model.')
 
+    def set_logging(self, every=1, runs=False):  # choose how trajectories are stored (replaces any logged so far)
+
+        self.replay = None
+        for segment in list(self.vowels.values()) + list(self.consonants.values()):
+            for gesture in segment.__dict__.values():
+                if isinstance(gesture, Gesture):
+                    gesture.cd_list = Trajectory(every, runs)  # keep one of every n iterations...
+                    gesture.strength_list = Trajectory(every, runs)  # ...optionally run-length encoded
+
+    def set_replay(self, every=100_000, checkpoints=None):
+        # store a checkpoint of every parameter every n iterations instead of trajectories, which are re-simulated
+
+        self.replay = Replay(self.compile_inventory(), every, checkpoints)
+        gestures = [s.tb_upper_gest for s in list(self.vowels.values()) + list(self.consonants.values())
+                    if s.tb_upper_gest is not None]  # same order as the compiled segment arrays
+        for s, gesture in enumerate(gestures):
+            for attrib, parameter in [('cd_list', 'cd'), ('strength_list', 'strength')]:
+                trajectory = ReplayTrajectory(self.replay, s, parameter)
+                if isinstance(getattr(gesture, attrib), ReplayTrajectory):  # keep count of iterations trained
+                    trajectory.n_logged = getattr(gesture, attrib).n_logged
+                setattr(gesture, attrib, trajectory)
+
+    def set_lexicon(self, filename=''):  # draw training trials from a frequency file's word shapes ('' for uniform)
+
+        if self.replay is not None:
+            raise ValueError('The lexicon of a model with replay trajectories can only be set when it is created.')
+        self.lexicon = Lexicon(read_lexicon(filename), self.vowels, self.consonants, filename) if filename else None
+
     def initialize_vowels(self, load=None):  # make all vowels under consideration and put them in a list
 
         if load:  # if provided with .json dict for loading in saved vowels
@@ -114,6 +656,7 @@ class Language:  # class of objects that define a vowel inventory and a height h
                 vowels[v] = json2seg(vowels[v])  # create Segment object from dict
         else:  # if creating a new vowel inventory
             vowels = {}  # initialize empty vowel dictionary
+            new_gesture = partial(Gesture, rng=self.rng, strength_range=self.strength_range)  # random strengths
 
             if 'ɛ' in self.pattern:  # if low-mid vowels are in pattern...
                 n_heights = 4  # ...then vowel inventory has at least 4 heights
@@ -122,20 +665,20 @@ class Language:  # class of objects that define a vowel inventory and a height h
             else:  # if there are no mid vowels in pattern...
                 n_heights = 2  # ...then vowel inventory has only 2 heights
 
-            vowels['i'] = Segment('i', tb_upper=Gesture(0, 4), tb_back=Gesture(0, 16))  # add /i/
-            vowels['u'] = Segment('u', tb_upper=Gesture(0, 4), tb_back=Gesture(0, 8))  # add /u/
+            vowels['i'] = Segment('i', tb_upper=new_gesture(0, 4), tb_back=new_gesture(0, 16))  # add /i/
+            vowels['u'] = Segment('u', tb_upper=new_gesture(0, 4), tb_back=new_gesture(0, 8))  # add /u/
 
             if n_heights == 3:  # three-height systems get mid vowels
-                vowels['e'] = Segment('e', tb_upper=Gesture(0, 10), tb_back=Gesture(0, 16))  # add true mid /e/
-                vowels['o'] = Segment('o', tb_upper=Gesture(0, 10), tb_back=Gesture(0, 8))  # add true mid /o/
+                vowels['e'] = Segment('e', tb_upper=new_gesture(0, 10), tb_back=new_gesture(0, 16))  # add true mid /e/
+                vowels['o'] = Segment('o', tb_upper=new_gesture(0, 10), tb_back=new_gesture(0, 8))  # add true mid /o/
 
             elif n_heights == 4:  # four-height systems get high-mid and low-mid vowels
-                vowels['e'] = Segment('e', tb_upper=Gesture(0, 8), tb_back=Gesture(0, 16))  # add high-mid /e/
-                vowels['o'] = Segment('o', tb_upper=Gesture(0, 8), tb_back=Gesture(0, 8))  # add high-mid /o/
-                vowels['ɛ'] = Segment('ɛ', tb_upper=Gesture(0, 12), tb_back=Gesture(0, 16))  # add low-mid /ɛ/
-                vowels['ɔ'] = Segment('ɔ', tb_upper=Gesture(0, 12), tb_back=Gesture(0, 8))  # add /low-mid /ɔ/
+                vowels['e'] = Segment('e', tb_upper=new_gesture(0, 8), tb_back=new_gesture(0, 16))  # add high-mid /e/
+                vowels['o'] = Segment('o', tb_upper=new_gesture(0, 8), tb_back=new_gesture(0, 8))  # add high-mid /o/
+                vowels['ɛ'] = Segment('ɛ', tb_upper=new_gesture(0, 12), tb_back=new_gesture(0, 16))  # add low-mid /ɛ/
+                vowels['ɔ'] = Segment('ɔ', tb_upper=new_gesture(0, 12), tb_back=new_gesture(0, 8))  # add /low-mid /ɔ/
 
-            vowels['a'] = Segment('a', tb_upper=Gesture(0, 16), tb_back=Gesture(0, 16))  # add /a/
+            vowels['a'] = Segment('a', tb_upper=new_gesture(0, 16), tb_back=new_gesture(0, 16))  # add /a/
 
         return vowels
 
@@ -149,16 +692,35 @@ class Language:  # class of objects that define a vowel inventory and a height h
                         consonants[c][attrib] = json2gest(consonants[c][attrib])  # create Gesture object from dict
                 consonants[c] = json2seg(consonants[c])  # create Segment object from dict
         else:  # if creating a new consonant inventory
-            consonants = {'g': Segment('g', tb_upper=Gesture(0, -2), tb_back=Gesture(0, -2)),
-                          'b': Segment('b', lip=Gesture(0, -2))}
+            new_gesture = partial(Gesture, rng=self.rng, strength_range=self.strength_range)  # random strengths
+            consonants = {'g': Segment('g', tb_upper=new_gesture(0, -2), tb_back=new_gesture(0, -2)),
+                          'b': Segment('b', lip=new_gesture(0, -2))}
 
         return consonants
 
-    def train_height_strength(self, rate=0.1, v_window=0.2, c_window=1):
+    def train_height_strength(self, rate=0.1, v_window=0.2, c_window=1, cycle_check=0, patience=0,
+                              report_every=10_000, callback=None, profile=False, max_iterations=5_000_000):
+        # cycle_check, patience: stop early if the state repeats at a multiple of cycle_check iterations, or if
+        # the number of errors hasn't gone down for patience iterations (both off by default)
+        # report_every, callback: update progress and call callback(stats) every report_every iterations
+        # profile: time each part of the training loop (returns and prints seconds per part)
+        # max_iterations: stop training after this many iterations (per call) if not converged
+
+        if self.replay is not None:
+            raise ValueError('Models with replay trajectories are trained with train_height_strength_array().')
+
+        table = self.build_error_table(v_window, c_window)  # persistent table of convergence errors
+        segment_index = {symbol: i for i, symbol in enumerate(table.symbols)}  # symbol -> error table index
+        for segment in list(self.vowels.values()) + list(self.consonants.values()):
+            if segment.tb_upper_gest is not None:  # trajectories loaded lazily are copied into memory to log to
+                segment.tb_upper_gest.cd_list.materialize()
+                segment.tb_upper_gest.strength_list.materialize()
+        detector = CycleDetector(cycle_check, patience) if cycle_check or patience else None
+        self.cycle_iteration = -1
+        self.stop_reason = ''
 
         it = 1  # initialize training trial counter
-        progress = tqdm()  # initialize progress bar
-        progress.update(1)  # increment progress bar once (so it starts at 1 and not 0)
+        telemetry = Telemetry(report_every, callback, profile)  # progress bar (updated every report_every trials)
 
         while self.convergence_iteration == -1:  # while the model is still learning (not converged)
 
@@ -174,14 +736,20 @@ class Language:  # class of objects that define a vowel inventory and a height h
 
             # Make a Random Training Trial #
 
-            n_syll = random.choice(range(1, 3))  # pick one or two syllables randomly each trial
-            if n_syll == 1:  # if the trial only has one syllable...
-                v1 = None  # ...then there is no v1 (monosyllables are v2 only)
-            else:  # otherwise if the trial has two syllables...
-                v1 = random.choice(list(self.vowels.values()))  # ...pick any vowel randomly for this trial for v1
+            if self.lexicon is not None:  # pick a word shape by its frequency (v1 is None for monosyllables)
+                n_syll, v1, v2, consonant = self.lexicon.sample(self.rng)
+            else:
+                n_syll = self.rng.choice(range(1, 3))  # pick one or two syllables randomly each trial
+                if n_syll == 1:  # if the trial only has one syllable...
+                    v1 = None  # ...then there is no v1 (monosyllables are v2 only)
+                else:  # otherwise if the trial has two syllables...
+                    v1 = self.rng.choice(list(self.vowels.values()))  # ...pick any vowel randomly for v1
+
+                v2 = self.rng.choice(list(self.vowels.values()))  # pick any vowel randomly each trial for v2
+                consonant = self.rng.choice(list(self.consonants.values()))  # pick any consonant randomly
 
-            v2 = random.choice(list(self.vowels.values()))  # pick any vowel randomly each trial for v2
-            consonant = random.choice(list(self.consonants.values()))  # pick any consonant randomly each trial
+            if profile:
+                telemetry.lap('sampling')
 
             # Consonant Blending with V2 (regardless of syllable count) #
 
@@ -245,6 +813,9 @@ class Language:  # class of objects that define a vowel inventory and a height h
                     elif output_v1 <= target_v1 - v_window:  # if learner v1 vowel is too high...
                         v1_cd_update += rate  # ...then make v1 lower (bigger CD)
 
+            if profile:
+                telemetry.lap('blending')
+
             # End of Training Trial - Do Gestural Parameter Updates
 
             if v1 is not None:  # if v1 exists
@@ -258,31 +829,66 @@ class Language:  # class of objects that define a vowel inventory and a height h
                 consonant.tb_upper_gest.update_strength(c_strength_update)  # update consonant strength
                 consonant.tb_upper_gest.update_cd(c_cd_update)  # update consonant constriction degree
 
+            if profile:
+                telemetry.lap('updates')
+
             # End of Training Trial - Log Trial
 
             for v in self.vowels.values():  # for each vowel being trained...
                 v.tb_upper_gest.log_strength()  # ...log its strength after this trial
                 v.tb_upper_gest.log_cd()  # ...and log its constriction degree after this trial
-                n_iter = len(v.tb_upper_gest.strength_list)
+                n_iter = v.tb_upper_gest.strength_list.n_logged
 
             for c in self.consonants.values():  # for each consonant being trained...
                 if c.tb_upper_gest is not None:  # ...if it has a TB upper gesture...
                     c.tb_upper_gest.log_strength()  # ...then log its strength after this trial
                     c.tb_upper_gest.log_cd()  # ...and log its constriction degree after this trial
 
+            if profile:
+                telemetry.lap('logging')
+
             # End of Training Trial - Check for Convergence
 
-            if self.check_convergence(v_window, c_window):  # check if all segments are within their windows
+            touched = [v2] if v1 is None else [v1, v2]  # segments whose parameters may have changed this trial
+            if consonant.tb_upper_gest is not None:
+                touched.append(consonant)
+            changed = []
+            for seg in touched:  # copy the parameters that changed into the error table...
+                s = segment_index[seg.symbol]
+                gesture = seg.tb_upper_gest
+                if table.cd[s] != gesture.cd or table.strength[s] != gesture.strength:
+                    table.cd[s] = gesture.cd
+                    table.strength[s] = gesture.strength
+                    changed.append(s)
+            if changed:
+                table.update(changed)  # ...and re-check only their constraints
+
+            stop_reason = detector.check(n_iter, table) if detector is not None else ''  # check if training is stuck
+
+            if profile:
+                telemetry.lap('convergence')
+
+            if table.converged():  # check if all segments are within their windows
                 self.convergence_iteration = n_iter  # record iteration of convergence
-                progress.close()
+                telemetry.close(it, n_iter, table)
                 print(f'Learner converged after {n_iter} iterations.')
+            elif stop_reason:
+                self.cycle_iteration = n_iter  # record iteration training was stopped at...
+                self.stop_reason = detector.stopped  # ...and which check stopped it
+                telemetry.close(it, n_iter, table)
+                print(f'Learner did not converge ({STOPPED[self.stop_reason]} at {n_iter} iterations: {stop_reason}).')
+                break  # stop training
             else:
+                if it >= telemetry.next_report:
+                    telemetry.report(it, n_iter, table)  # update progress bar and call back
                 it += 1  # increment iteration counter
-                progress.update(1)  # increment progress bar
-                if it > 5_000_000:  # if 5 million iteration cutoff is reached
+                if it > max_iterations:  # if iteration cutoff (5 million by default) is reached
+                    telemetry.close(it - 1, n_iter, table)
                     print(f'Learner did not converge after {n_iter} iterations.')
                     break  # stop training
 
+        return telemetry.profile
+
     def check_convergence(self, v_window=0.2, c_window=1):  # check to see if model has converged (no more errors)
 
         converged = True
@@ -317,9 +923,192 @@ class Language:  # class of objects that define a vowel inventory and a height h
 
         return converged
 
-    def plot_training(self):
+    def symmetry_classes(self):  # groups of vowels that play identical roles (e.g. front/back pairs like i and u)
+
+        # start from vowels with the same teacher cd and trigger status, then split any group whose members
+        # harmonize to vowels in different groups, until no group splits
+        signature = {v: (vowel.tb_upper_gest.cd_teacher, v in self.trigger) for v, vowel in self.vowels.items()}
+        n_classes = 0
+        while len(set(signature.values())) != n_classes:
+            n_classes = len(set(signature.values()))
+            class_ids = {key: k for k, key in enumerate(dict.fromkeys(signature.values()))}
+            signature = {v: (class_ids[signature[v]], class_ids[signature[self.pattern[v]]]) for v in self.vowels}
+
+        classes = {}
+        for v in self.vowels:
+            classes.setdefault(signature[v], []).append(v)
+
+        return list(classes.values())
+
+    def compile_inventory(self, tied=False):  # flatten the inventory and pattern into arrays for the array engine
+        # tied: one segment per symmetry class of vowels (its first member), trained on behalf of every member
+
+        consonants = list(self.consonants.values())
+        dorsals = [c for c in consonants if c.tb_upper_gest is not None]  # only dorsal consonants are trained
+        classes = self.symmetry_classes() if tied else [[v] for v in self.vowels]
+        vowels = [self.vowels[members[0]] for members in classes]
+        segments = vowels + dorsals  # vowels come first, so a vowel's segment index is its vowel index
+        vowel_index = {v: i for i, members in enumerate(classes) for v in members}
+
+        arrays = {'symbols': [s.symbol for s in segments],
+                  'members': classes + [[c.symbol] for c in dorsals],  # symbols trained by each segment
+                  # segment index of every vowel in the inventory (trials pick any vowel, then train its segment)
+                  'vowel_class': np.array([vowel_index[v] for v in self.vowels], dtype=np.int64),
+                  'n_vowels': len(vowels),
+                  'n_consonants': len(consonants),
+                  'cd': np.array([s.tb_upper_gest.cd for s in segments], dtype=float),
+                  'strength': np.array([s.tb_upper_gest.strength for s in segments], dtype=float),
+                  'cd_teacher': np.array([s.tb_upper_gest.cd_teacher for s in segments], dtype=float),
+                  # teacher cd that each vowel should surface with as v1 before a harmony trigger
+                  'harmony_target': np.array([self.vowels[self.pattern[v.symbol]].tb_upper_gest.cd_teacher
+                                              for v in vowels], dtype=float),
+                  'trigger': np.array([v.symbol in self.trigger for v in vowels], dtype=bool),
+                  # segment index of each consonant's TB upper gesture (-1 if the consonant is not dorsal)
+                  'consonant_segment': np.array([len(vowels) + dorsals.index(c) if c in dorsals else -1
+                                                 for c in consonants], dtype=np.int64),
+                  'lexicon': self.lexicon}  # word shapes to draw trials from (None for uniform trials)
+
+        return arrays
+
+    def build_error_table(self, v_window=0.2, c_window=1, arrays=None, fixed_point=False):
+        # error table for incremental convergence (fixed_point: parameters and windows in integer hundredths)
+
+        if arrays is None:
+            arrays = self.compile_inventory()
+
+        consonant_segment = arrays['consonant_segment'].tolist()
+        if fixed_point:
+            table = FixedErrorTable(hundredths(arrays['cd']).tolist(), hundredths(arrays['strength']).tolist(),
+                                    hundredths(arrays['cd_teacher']).tolist(),
+                                    hundredths(arrays['harmony_target']).tolist(), arrays['trigger'].tolist(),
+                                    [s for s in consonant_segment if s >= 0], arrays['n_vowels'],
+                                    hundredths(v_window), hundredths(c_window), arrays['symbols'])
+        else:
+            table = ErrorTable(arrays['cd'].tolist(), arrays['strength'].tolist(), arrays['cd_teacher'].tolist(),
+                               arrays['harmony_target'].tolist(), arrays['trigger'].tolist(),
+                               [s for s in consonant_segment if s >= 0], arrays['n_vowels'], v_window, c_window,
+                               arrays['symbols'])
+
+        return table
+
+    def train_height_strength_array(self, rate=0.1, v_window=0.2, c_window=1, seed=None, block_size=100_000,
+                                    cycle_check=0, patience=0, report_every=10_000, callback=None, profile=False,
+                                    max_iterations=5_000_000, fixed_point=False, tied=False):
+        # fixed_point: train on integer hundredths (integer updates and cross-multiplied window tests, no rounding)
+        # tied: train one set of parameters per symmetry class of vowels (members start from the first member's)
+
+        if tied and self.replay is not None:
+            raise ValueError('Tied training is not available for models with replay trajectories.')
+
+        arrays = self.compile_inventory(tied)  # flat array view of inventory and pattern
+        if seed is None:
+            seed = self.rng.getrandbits(64)  # training trials follow from the model's own seed
+        rng = np.random.default_rng(seed)  # trials are drawn in blocks from a numpy Generator
+
+        segments = {**self.vowels, **self.consonants}
+        gestures = [[segments[symbol].tb_upper_gest for symbol in members]
+                    for members in arrays['members']]  # gestures trained by each compiled segment
+        n_vowels = len(arrays['vowel_class'])  # trials pick from every vowel...
+        vowel_class = arrays['vowel_class'] if tied else None  # ...which is trained as its class's segment if tied
+        n_consonants = arrays['n_consonants']
+
+        table = self.build_error_table(v_window, c_window, arrays, fixed_point)  # persistent table of errors
+
+        # python lists index much faster than numpy arrays one scalar at a time, so the trial loop runs on lists
+        cd = table.cd  # shared with the error table
+        strength = table.strength
+        inventory = {'cd_teacher': table.cd_teacher, 'harmony_target': table.harmony_target,
+                     'trigger': arrays['trigger'].tolist(), 'consonant_segment': arrays['consonant_segment'].tolist()}
+        if fixed_point:
+            rate, v_window, c_window = hundredths(rate), hundredths(v_window), hundredths(c_window)
+        trials_run = run_trials_fixed if fixed_point else run_trials
+        scale = 100 if fixed_point else 1  # parameters are in hundredths during training if fixed_point
+
+        n_logged = gestures[0][0].strength_list.n_logged  # iterations logged by earlier calls (training can be resumed)
+        start_cd = cd[:]  # parameters before this call, used to rebuild the trajectories from change logs
+        start_strength = strength[:]
+        cd_changes = [([], []) for _ in gestures]  # (trial, value) every time a segment's cd changes
+        strength_changes = [([], []) for _ in gestures]  # (trial, value) every time a segment's strength changes
+        changes = (cd_changes, strength_changes) if self.replay is None else None  # replay models log nothing
+
+        detector = CycleDetector(cycle_check, patience) if cycle_check or patience else None
+        self.cycle_iteration = -1
+        self.stop_reason = ''
+        stop_reason = ''  # why training was stopped early, if it was
+
+        it = 0  # trials run during this call
+        telemetry = Telemetry(report_every, callback, profile)  # progress bar (updated every report_every trials)
+
+        while self.convergence_iteration == -1 and not stop_reason and it < max_iterations:  # until convergence or cutoff
+
+            # Draw a Block of Random Training Trials #
+
+            if self.replay is None:
+                trials = draw_trials(rng, min(block_size, max_iterations - it), n_vowels, n_consonants, vowel_class,
+                                     arrays['lexicon'])
+            else:  # each block starts at a checkpoint with its own generator, so it can be replayed on its own
+                self.replay.checkpoint(n_logged + it, cd, strength, seed, rate, v_window, c_window, fixed_point)
+                trials = draw_trials(np.random.default_rng([seed, n_logged + it]), self.replay.every, n_vowels,
+                                     n_consonants, lexicon=arrays['lexicon'])
+                trials = [column[:max_iterations - it] for column in trials]
+
+            if profile:
+                telemetry.lap('sampling')
+
+            it, stop_reason = trials_run(trials, cd, strength, inventory, rate, v_window, c_window, it, changes,
+                                         table, detector, telemetry, n_logged)
+
+            if stop_reason == 'converged':
+                self.convergence_iteration = n_logged + it  # record iteration of convergence
+                stop_reason = ''
+            elif stop_reason:
+                self.cycle_iteration = n_logged + it  # record iteration training was stopped at...
+                self.stop_reason = detector.stopped  # ...and which check stopped it
+
+        # Write Results Back Into Gesture Objects #
+
+        for s, members in enumerate(gestures):
+            if self.replay is None:
+                cd_list = expand_changes(start_cd[s], cd_changes[s], it) / scale
+                strength_list = expand_changes(start_strength[s], strength_changes[s], it) / scale
+            for gesture in members:  # (every member of a tied segment gets the same results)
+                gesture.cd = cd[s] / scale if fixed_point else cd[s]
+                gesture.strength = strength[s] / scale if fixed_point else strength[s]
+                if self.replay is None:
+                    gesture.cd_list.extend(cd_list)
+                    gesture.strength_list.extend(strength_list)
+                else:  # nothing to store, replay trajectories just count iterations
+                    gesture.cd_list.n_logged += it
+                    gesture.strength_list.n_logged += it
+
+        if profile:
+            telemetry.lap('logging')  # the change logs are expanded into trajectories all at once
+
+        telemetry.close(it, n_logged + it, table)
+
+        if self.convergence_iteration != -1:
+            print(f'Learner converged after {self.convergence_iteration} iterations.')
+        elif stop_reason:
+            print(f'Learner did not converge ({STOPPED[self.stop_reason]} at {n_logged + it} iterations: '
+                  f'{stop_reason}).')
+        else:
+            print(f'Learner did not converge after {n_logged + it} iterations.')
+
+        return telemetry.profile
+
+    def plot_training(self, start=0, stop=None, max_points=2000):
+        # plot iterations start through stop - 1, each line downsampled to about max_points points
+
+        if stop is None:
+            stop = self.vowels[self.trigger[0]].tb_upper_gest.strength_list.n_logged  # plot to the end of training
 
         colors = pl.cm.viridis(np.linspace(0, 1, len(self.vowels)))  # make a colormap for plotting
+        dorsals = [c for c in self.consonants.values() if c.tb_upper_gest is not None]
+        gestures = [s.tb_upper_gest for s in list(self.vowels.values()) + dorsals]
+        windows = plot_windows([g.strength_list for g in gestures] + [g.cd_list for g in gestures], start, stop,
+                               max_points)  # (every trajectory is read in one pass)
+        strength_windows = dict(zip(gestures, windows[:len(gestures)]))
+        cd_windows = dict(zip(gestures, windows[len(gestures):]))
         x = 0  # initialize counter for colormap
 
         plt.figure('Gestural Strength Learning Trajectories')
@@ -328,24 +1117,24 @@ class Language:  # class of objects that define a vowel inventory and a height h
         ymax = 0  # initialize maximum y value for plot
 
         for v in self.vowels.values():
-            if max(v.tb_upper_gest.strength_list) > ymax:
-                ymax = max(v.tb_upper_gest.strength_list)  # record new maximum y value
-            plt.plot(v.tb_upper_gest.strength_list, '-', color=colors[x], label=v.symbol)  # plot vowel strength
+            iterations, strengths = strength_windows[v.tb_upper_gest]
+            if len(strengths) and strengths.max() > ymax:
+                ymax = strengths.max()  # record new maximum y value
+            plt.plot(iterations, strengths, '-', color=colors[x], label=v.symbol)  # plot vowel strength
             x += 1  # iterate counter for colormap
-            length = len(v.tb_upper_gest.strength_list)
-        plt.axis([0, length, 0, plt_round(ymax)])
+        plt.axis([start, stop, 0, plt_round(ymax)])
         plt.legend(bbox_to_anchor=(0, 0, 1, 1), bbox_transform=plt.gcf().transFigure, loc='upper right')
 
         plt.subplot(2, 1, 2)
 
         ymax = 0  # initialize maximum y value for plot
 
-        for c in self.consonants.values():
-            if c.tb_upper_gest is not None:
-                if max(c.tb_upper_gest.strength_list) > ymax:
-                    ymax = max(c.tb_upper_gest.strength_list)  # record new maximum y value
-                plt.plot(c.tb_upper_gest.strength_list, 'k-', label=c.symbol)  # plot  consonant strength
-        plt.axis([0, length, 0, plt_round(ymax)])
+        for c in dorsals:
+            iterations, strengths = strength_windows[c.tb_upper_gest]
+            if len(strengths) and strengths.max() > ymax:
+                ymax = strengths.max()  # record new maximum y value
+            plt.plot(iterations, strengths, 'k-', label=c.symbol)  # plot  consonant strength
+        plt.axis([start, stop, 0, plt_round(ymax)])
         plt.legend(bbox_to_anchor=(0, 0, 1, 1), bbox_transform=plt.gcf().transFigure, loc='center right')
 
         plt.figure('Constriction Degree Learning Trajectories')
@@ -353,14 +1142,15 @@ class Language:  # class of objects that define a vowel inventory and a height h
         x = 0  # re-initialize counter for colormap
 
         for v in self.vowels.values():
-            plt.plot(v.tb_upper_gest.cd_list, '-', color=colors[x], label=v.symbol)  # plot vowel constriction degree
+            iterations, cds = cd_windows[v.tb_upper_gest]
+            plt.plot(iterations, cds, '-', color=colors[x], label=v.symbol)  # plot vowel constriction degree
             x += 1
-        plt.axis([0, length, -5, 20])
+        plt.axis([start, stop, -5, 20])
         plt.legend(bbox_to_anchor=(0, 0, 1, 1), bbox_transform=plt.gcf().transFigure, loc='upper right')
 
-        for c in self.consonants.values():
-            if c.tb_upper_gest is not None:
-                plt.plot(c.tb_upper_gest.cd_list, 'k-', label=c.symbol)  # plot consonant constriction degree
+        for c in dorsals:
+            iterations, cds = cd_windows[c.tb_upper_gest]
+            plt.plot(iterations, cds, 'k-', label=c.symbol)  # plot consonant constriction degree
         plt.legend(bbox_to_anchor=(0, 0, 1, 1), bbox_transform=plt.gcf().transFigure, loc='center right')
 
         plt.show()
@@ -383,70 +1173,389 @@ class Language:  # class of objects that define a vowel inventory and a height h
                       \nLearner Strength {round(c.tb_upper_gest.strength, 2)}\n')
 
         if self.convergence_iteration == -1:
-            print(f'Learner did not converge after {len(v.tb_upper_gest.strength_list)} iterations.')
+            print(f'Learner did not converge after {v.tb_upper_gest.strength_list.n_logged} iterations.')
         else:
             print(f'Learner converged after {self.convergence_iteration} iterations.')
 
-    def dict(self):  # make Language object json serializable
-
-        lang_dict = deepcopy(self.__dict__)  # copy object dictionary
+    def dict(self, arrays=None):  # make Language object json serializable
 
-        for item in lang_dict['vowels']:
-            if isinstance(lang_dict['vowels'][item], Segment):
-                lang_dict['vowels'][item] = lang_dict['vowels'][item].dict()  # serialize vowel Segments
+        lang_dict = {}
 
-        for item in lang_dict['consonants']:
-            if isinstance(lang_dict['consonants'][item], Segment):
-                lang_dict['consonants'][item] = lang_dict['consonants'][item].dict()  # serialize consonant Segments
+        for item, value in self.__dict__.items():
+            if item in ['vowels', 'consonants']:  # serialize vowel and consonant Segments
+                lang_dict[item] = {symbol: segment.dict(arrays) for symbol, segment in value.items()}
+            elif item == 'rng':
+                lang_dict[item] = value.getstate()  # random number generator state, so training can be resumed
+            elif item in ['replay', 'lexicon']:
+                lang_dict[item] = value.dict() if value is not None else None
+            else:
+                lang_dict[item] = deepcopy(value)
 
         return lang_dict
 
-    def save(self, check_sure=True):
+    def save(self, check_sure=True, binary=False):  # binary models store trajectories as raw arrays (.ggla)
+
+        extension = '.ggla' if binary else '.json'
+        filename = os.path.splitext(self.model_name)[0] + extension  # (the model's filename in the format asked for)
 
-        if self.model_name and check_sure and input(f'Model file {self.model_name} already exists. \
-        Do you want to replace it? (y / n)') in ['y', 'Y', 'yes', 'Yes', 'YES']:  # check if sure about replacing
-            filename = self.model_name
+        if self.model_name and check_sure and (not os.path.isfile(filename) or input(f'Model file {filename} already \
+        exists. Do you want to replace it? (y / n)') in ['y', 'Y', 'yes', 'Yes', 'YES']):  # check if sure about replacing
+            self.model_name = filename
         else:
             it = 1  # initialize model marker
-            while os.path.isfile(f'{self.pattern_name[:-5]}_model_{it}.json'):  # check to see if saved file exists
+            while os.path.isfile(f'{self.pattern_name[:-5]}_model_{it}{extension}'):  # check if saved file exists
                 it += 1  # if so, iterate its marker until you find one not already in use
-            filename = f'{self.pattern_name[:-5]}_model_{it}.json'  # append marker to filename
+            filename = f'{self.pattern_name[:-5]}_model_{it}{extension}'  # append marker to filename
             print(f'Saving model as {filename}.')
 
             self.model_name = filename  # record the model's filename
 
-        with open(filename, 'w') as model_json_file:
-            json.dump(self.dict(), model_json_file)  # save to current directory
-            model_json_file.close()
+        if binary:
+            arrays = []  # trajectories' typed arrays, filled in while serializing
+            write_model(filename, self.dict(arrays), arrays)
+        else:
+            with open(filename, 'w') as model_json_file:
+                json.dump(self.dict(), model_json_file)  # save to current directory
+                model_json_file.close()
+
+    def export_trajectories(self, layout='rows', stride=1, binary=False, chunk_size=65536):
+        # rows: one tab-delimited row per segment (_strengths.txt, _targets.txt)
+        # columns: one column per segment and one row per iteration, tab-delimited (.tsv) or a binary table (.npy)
+        # stride: export one of every this many logged values; chunk_size: values written at a time
 
-    def export_trajectories(self):
+        if binary and layout != 'columns':
+            raise ValueError("Binary exports (.npy) are only available with layout='columns'.")
 
         if not self.model_name:
             self.save()  # save model if not yet saved
 
-        filename = self.model_name[:-5]
-
-        with open(filename + '_strengths.txt', 'w') as strength_output:  # write strengths to file
-            strength_output.write('tb_upper Gestural Strength Learning Trajectories\n')
-            for v in self.vowels.values():
-                line = v.symbol + '\t' + '\t'.join(str(x) for x in v.tb_upper_gest.strength_list) + '\n'
-                strength_output.write(line)
-            for c in self.consonants.values():
-                if c.tb_upper_gest is not None:
-                    line = c.symbol + '\t' + '\t'.join(str(x) for x in c.tb_upper_gest.strength_list) + '\n'
-                    strength_output.write(line)
-            strength_output.close()
-
-        with open(filename + '_targets.txt', 'w') as target_output:  # write target constriction degrees to file
-            target_output.write('tb_upper Gestural Target Learning Trajectories\n')
-            for v in self.vowels.values():
-                line = v.symbol + '\t' + '\t'.join(str(x) for x in v.tb_upper_gest.cd_list) + '\n'
-                target_output.write(line)
-            for c in self.consonants.values():
-                if c.tb_upper_gest is not None:
-                    line = c.symbol + '\t' + '\t'.join(str(x) for x in c.tb_upper_gest.cd_list) + '\n'
-                    target_output.write(line)
-            target_output.close()
+        filename = os.path.splitext(self.model_name)[0]
+        segments = [s for s in list(self.vowels.values()) + list(self.consonants.values())
+                    if s.tb_upper_gest is not None]  # vowels and dorsal consonants
+        step = chunk_size * stride  # logged values covered by each chunk
+
+        for suffix, title, attrib in [('_strengths', 'tb_upper Gestural Strength Learning Trajectories', 'strength_list'),
+                                      ('_targets', 'tb_upper Gestural Target Learning Trajectories', 'cd_list')]:
+            trajectories = [getattr(s.tb_upper_gest, attrib) for s in segments]
+            n_values = len(trajectories[0])  # every segment logs the same iterations
+            every = trajectories[0].every
+            # one chunk of every segment at a time (so replayed trajectories are re-simulated only once)
+            chunks = zip(*(trajectory.blocks(0, n_values, step) for trajectory in trajectories))
+
+            if layout == 'rows':  # write each segment's row to its own temporary file, then join them
+                rows = [tempfile.TemporaryFile('w+') for _ in segments]
+                position = 0  # position of the chunk's first value
+                for chunk in chunks:
+                    for row, values in zip(rows, chunk):
+                        row.write(''.join('\t' + str(x) for x in values[-position % stride::stride].tolist()))
+                    position += len(chunk[0])
+                with open(filename + suffix + '.txt', 'w') as output:
+                    output.write(title + '\n')
+                    for segment, row in zip(segments, rows):
+                        output.write(segment.symbol)
+                        row.seek(0)
+                        shutil.copyfileobj(row, output)
+                        output.write('\n')
+                        row.close()
+
+            elif binary:  # fill a memory-mapped .npy table one chunk of rows at a time
+                columns = [('iteration', np.int64)] + [(s.symbol, float) for s in segments]
+                table = np.lib.format.open_memmap(filename + suffix + '.npy', mode='w+', dtype=columns,
+                                                  shape=(-(-n_values // stride),), version=(3, 0))  # (utf-8 names)
+                position = 0
+                for chunk in chunks:
+                    kept = np.arange(position, position + len(chunk[0]))[-position % stride::stride]
+                    rows = slice(-(-position // stride), -(-position // stride) + len(kept))
+                    table['iteration'][rows] = kept * every
+                    for segment, values in zip(segments, chunk):
+                        table[segment.symbol][rows] = values[-position % stride::stride]
+                    position += len(chunk[0])
+                table.flush()
+                del table
+
+            else:  # write tab-delimited rows one chunk at a time
+                with open(filename + suffix + '.tsv', 'w') as output:
+                    output.write('\t'.join(['iteration'] + [s.symbol for s in segments]) + '\n')
+                    position = 0
+                    for chunk in chunks:
+                        iterations = (np.arange(position, position + len(chunk[0]))[-position % stride::stride] *
+                                      every).tolist()
+                        columns = [values[-position % stride::stride].tolist() for values in chunk]
+                        output.writelines('\t'.join(str(x) for x in row) + '\n' for row in zip(iterations, *columns))
+                        position += len(chunk[0])
+
+
+class Ensemble:  # many independent learners of the same pattern, trained in lockstep as one set of arrays
+
+    def __init__(self, new, n_learners=1000, seed=None, fixed_point=False, tied=False, lexicon='',
+                 strength_range=(1, 20)):
+        self.pattern_name = new  # filename for language pattern dictionary from .json file
+        self.strength_range = list(strength_range)  # lowest and highest initial strength of every gesture
+        self.rng = np.random.default_rng(seed)  # draws initial strengths and every learner's training trials
+        self.fixed_point = fixed_point  # constriction degrees and strengths are stored as integer hundredths
+
+        arrays = Language(new=new, lexicon=lexicon).compile_inventory(tied)  # inventory and pattern of every learner
+        self.symbols = arrays['symbols']
+        self.members = arrays['members']  # symbols trained by each segment (several per symmetry class if tied)
+        self.vowel_class = arrays['vowel_class']  # segment index of every vowel in the inventory
+        self.n_learners = n_learners
+        self.n_vowels = arrays['n_vowels']
+        self.n_consonants = arrays['n_consonants']
+        self.cd_teacher = hundredths(arrays['cd_teacher']) if fixed_point else arrays['cd_teacher']
+        self.harmony_target = hundredths(arrays['harmony_target']) if fixed_point else arrays['harmony_target']
+        self.trigger = arrays['trigger']
+        self.consonant_segment = arrays['consonant_segment']
+        self.dorsals = self.consonant_segment[self.consonant_segment >= 0]  # segment indices of dorsal consonants
+        self.triggers = np.flatnonzero(self.trigger)  # segment indices of harmony triggers
+        self.lexicon = arrays['lexicon']  # word shapes to draw trials from (None for uniform trials)
+
+        # learner x segment parameters (every gesture starts as /a/ with a random strength, like Gesture)
+        self.cd = np.tile(hundredths(arrays['cd']) if fixed_point else arrays['cd'], (n_learners, 1))
+        self.strength = self.rng.integers(strength_range[0], strength_range[1] + 1, (n_learners, len(self.symbols)))
+        self.strength = self.strength * 100 if fixed_point else self.strength.astype(float)
+
+        self.n_iter = 0  # iterations run by the ensemble (every learner that hasn't converged runs each one)
+        self.convergence_iteration = np.full(n_learners, -1)  # per learner (-1 means no convergence yet)
+
+    def train_height_strength(self, rate=0.1, v_window=0.2, c_window=1, block_size=1000, max_iterations=5_000_000,
+                              lockstep_min=64):
+        # max_iterations: stop training learners that haven't converged after this many iterations (per call)
+        # lockstep_min: once fewer learners than this are left, each one finishes its blocks on its own with the array
+        # engine's trial loop (run_trials), since a lockstep trial costs about the same for a few learners as for many
+
+        fixed_point = self.fixed_point
+        if fixed_point:  # integer updates, and blends compared to windows by cross-multiplying (see run_trials_fixed)
+            rate, v_window, c_window = hundredths(rate), hundredths(v_window), hundredths(c_window)
+        strength_floor = 100 if fixed_point else 1  # strength can't go below 1...
+        cd_floor = -200 if fixed_point else -2  # ...and constriction degree can't go below -2
+
+        cd = self.cd.reshape(-1)  # flat views: learner l's segment s is at l * n_segments + s
+        strength = self.strength.reshape(-1)
+        n_segments = len(self.symbols)
+        cd_teacher = self.cd_teacher
+        harmony_target = self.harmony_target
+        trigger = self.trigger
+        consonant_segment = self.consonant_segment
+
+        # the same inventory as lists, for learners training on their own
+        inventory = {'cd_teacher': cd_teacher.tolist(), 'harmony_target': harmony_target.tolist(),
+                     'trigger': trigger.tolist(), 'consonant_segment': consonant_segment.tolist()}
+        dorsals = [c for c in inventory['consonant_segment'] if c >= 0]
+        error_table = FixedErrorTable if fixed_point else ErrorTable
+        trials_run = run_trials_fixed if fixed_point else run_trials
+
+        learners = np.flatnonzero(self.convergence_iteration == -1)  # learners still training
+        it = 0  # iterations run during this call
+        progress = tqdm(total=len(learners))  # counts converged learners
+
+        while len(learners) and it < max_iterations:  # until every learner converges or the iteration cutoff
+
+            # Draw a Block of Random Training Trials for Every Learner Still Training #
+
+            n_block = min(block_size, max_iterations - it)
+            shape = (n_block, len(learners))  # trial by learner
+            if self.lexicon is not None:  # word shapes by frequency
+                n_sylls, v1s, v2s, cs = self.lexicon.draw(self.rng, shape)
+            else:
+                n_sylls = self.rng.integers(1, 3, shape)
+                v1s = self.rng.integers(0, len(self.vowel_class), shape)
+                v2s = self.rng.integers(0, len(self.vowel_class), shape)
+                cs = self.rng.integers(0, self.n_consonants, shape)
+            v1s, v2s = self.vowel_class[v1s], self.vowel_class[v2s]
+
+            # Few Learners Left: Run Each Learner's Block of Trials on Its Own #
+
+            if len(learners) < lockstep_min:
+                converged = np.zeros(len(learners), dtype=bool)
+                ran = 0  # trials run before the last learner converged, or the whole block
+                for l, learner in enumerate(learners):
+                    table = error_table(self.cd[learner].tolist(), self.strength[learner].tolist(),
+                                        inventory['cd_teacher'], inventory['harmony_target'], inventory['trigger'],
+                                        dorsals, self.n_vowels, v_window, c_window, self.symbols)
+                    n, stop_reason = trials_run([n_sylls[:, l].tolist(), v1s[:, l].tolist(), v2s[:, l].tolist(),
+                                                 cs[:, l].tolist()], table.cd, table.strength, inventory, rate,
+                                                v_window, c_window, table=table)
+                    self.cd[learner] = table.cd
+                    self.strength[learner] = table.strength
+                    if stop_reason == 'converged':
+                        self.convergence_iteration[learner] = self.n_iter + it + n  # record each learner
+                        converged[l] = True
+                    ran = max(ran, n)
+                learners = learners[~converged]  # converged learners stop training
+                progress.update(int(converged.sum()))
+                it += ran
+                continue
+
+            # Work Out Everything That Depends Only on the Trials for the Whole Block #
+
+            cs = consonant_segment[cs]
+            offsets = learners * n_segments  # flat index of each training learner's first segment
+            two = n_sylls == 2  # two-syllable trials
+            dorsal = cs >= 0  # trials with a dorsal consonant
+            cs = np.where(dorsal, cs, 0)  # (non-dorsal trials index a vowel here, but are masked out)
+            harmony = two & trigger[v2s]  # v1 blends with v2 and follows the pattern
+            faithful = two & ~trigger[v2s]  # v1 surfaces faithfully
+            block = [two, dorsal, harmony, faithful,
+                     offsets + v1s, offsets + v2s, offsets + cs,  # flat indices of each trial's segments
+                     cd_teacher[cs] + c_window, cd_teacher[cs] - c_window,  # edges of each trial's error windows
+                     cd_teacher[v2s] + v_window, cd_teacher[v2s] - v_window,
+                     harmony_target[v1s] + v_window, harmony_target[v1s] - v_window,
+                     cd_teacher[v1s] + v_window, cd_teacher[v1s] - v_window]
+            columns = None  # block columns of the learners still training, once some have converged
+
+            for t in range(n_block):
+
+                it += 1
+
+                trial = [trials[t] for trials in block]
+                if columns is not None:  # (cheaper than copying the rest of the block every time a learner converges)
+                    trial = [values[columns] for values in trial]
+                (two, dorsal, harmony, faithful, v1_index, v2_index, c_index, c_high, c_low, v2_high, v2_low,
+                 harmony_high, harmony_low, v1_high, v1_low) = trial
+
+                cd_v1, strength_v1 = cd[v1_index], strength[v1_index]
+                cd_v2, strength_v2 = cd[v2_index], strength[v2_index]
+                cd_c, strength_c = cd[c_index], strength[c_index]
+
+                # Consonant Blending with V2 (regardless of syllable count) #
+
+                if fixed_point:
+                    weighted_c = cd_c * strength_c + cd_v2 * strength_v2  # blended c times total strength
+                    total = strength_c + strength_v2
+                    too_open = dorsal & (weighted_c >= c_high * total)
+                    too_closed = dorsal & ~too_open & (weighted_c <= c_low * total)
+                else:
+                    output_c = ((cd_c * strength_c) + (cd_v2 * strength_v2)) / (strength_c + strength_v2)
+                    too_open = dorsal & (output_c >= c_high)
+                    too_closed = dorsal & ~too_open & (output_c <= c_low)
+                c_step = rate * (too_closed.astype(cd.dtype) - too_open)  # +rate if too closed, -rate if too open
+
+                # V2 Target Learning (regardless of syllable count) #
+
+                too_low = cd_v2 >= v2_high
+                too_high = ~too_low & (cd_v2 <= v2_low)
+                v2_step = rate * (too_high.astype(cd.dtype) - too_low)
+
+                # Two Syllable Words: Vowel Blending for Harmony #
+
+                if fixed_point:
+                    weighted_v1 = cd_v1 * strength_v1 + cd_v2 * strength_v2  # blended v1 times total strength
+                    total = strength_v1 + strength_v2
+                    too_low = harmony & (weighted_v1 >= harmony_high * total)
+                    too_high = harmony & ~too_low & (weighted_v1 <= harmony_low * total)
+                else:
+                    output_v1 = ((cd_v1 * strength_v1) + (cd_v2 * strength_v2)) / (strength_v1 + strength_v2)
+                    too_low = harmony & (output_v1 >= harmony_high)
+                    too_high = harmony & ~too_low & (output_v1 <= harmony_low)
+                harmony_step = rate * (too_high.astype(cd.dtype) - too_low)  # +rate if blended v1 is too high
+
+                # Two Syllable Words: V1 Target Learning (Without Harmony) #
+
+                too_low = faithful & (cd_v1 >= v1_high)
+                too_high = faithful & ~too_low & (cd_v1 <= v1_low)
+                v1_step = rate * (too_high.astype(cd.dtype) - too_low)
+
+                # End of Training Trial - Do Gestural Parameter Updates (v1, then v2, then c, like Gesture) #
+
+                changed = np.zeros(len(learners), dtype=bool)  # learners whose parameters changed this trial
+
+                for index, s_update, cd_update, mask in (
+                        (v1_index, harmony_step, harmony_step + v1_step, two),
+                        (v2_index, c_step - harmony_step, c_step + v2_step + harmony_step, True),
+                        (c_index, -c_step, c_step, dorsal)):  # (summed in the same order as run_trials)
+                    old = strength[index]  # re-read, since v1 and v2 can be the same vowel
+                    new = old + s_update
+                    new = np.where(mask & (new >= strength_floor), new if fixed_point else np.round(new, 2), old)
+                    strength[index] = new
+                    changed |= new != old
+                    old = cd[index]
+                    new = old + cd_update
+                    new = np.where(mask & (new >= cd_floor), new if fixed_point else np.round(new, 2), old)
+                    cd[index] = new
+                    changed |= new != old
+
+                # End of Training Trial - Check for Convergence (only possible for learners that changed) #
+
+                if not changed.any():
+                    continue
+
+                converged = np.zeros(len(learners), dtype=bool)
+                converged[changed] = self.converged(learners[changed], v_window, c_window, hundredths_windows=True)
+                if converged.any():
+                    self.convergence_iteration[learners[converged]] = self.n_iter + it  # record each learner
+                    learners = learners[~converged]  # converged learners stop training...
+                    if columns is None:
+                        columns = np.arange(len(converged))
+                    columns = columns[~converged]  # ...and drop out of the rest of the block's trials
+                    progress.update(int(converged.sum()))
+                    if not len(learners):
+                        break
+
+        progress.close()
+        self.n_iter += it
+
+        n_converged = int((self.convergence_iteration != -1).sum())
+        print(f'{n_converged} of {self.n_learners} learners converged within {self.n_iter} iterations.')
+
+    def converged(self, learners, v_window=0.2, c_window=1, hundredths_windows=False):
+        # Language.check_convergence for many learners (hundredths_windows: windows already in fixed point)
+
+        if self.fixed_point and not hundredths_windows:
+            v_window, c_window = hundredths(v_window), hundredths(c_window)
+
+        n_vowels = self.n_vowels
+        cd = self.cd[learners]
+        converged = (np.abs(cd[:, :n_vowels] - self.cd_teacher[:n_vowels]) < v_window).all(axis=1)  # vowel errors
+        if not converged.any():  # (blends are only checked for learners with every vowel target right)
+            return converged
+        cd = cd[converged]
+        strength = self.strength[learners[converged]]
+        cd_v = cd[:, None, :n_vowels]  # learner x 1 x vowel, to pair with every consonant or trigger at once
+        strength_v = strength[:, None, :n_vowels]
+        errors = np.zeros(len(cd), dtype=bool)
+
+        cd_c = cd[:, self.dorsals, None]  # consonant errors in CV sequences (learner x consonant x 1)
+        strength_c = strength[:, self.dorsals, None]
+        target_c = self.cd_teacher[self.dorsals, None]
+        if self.fixed_point:  # cross-multiplied by the total strength
+            total = strength_c + strength_v
+            errors |= (np.abs(cd_c * strength_c + cd_v * strength_v - target_c * total) >=
+                       c_window * total).any(axis=(1, 2))
+        else:
+            output_c = ((cd_c * strength_c) + (cd_v * strength_v)) / (strength_c + strength_v)
+            errors |= (np.abs(output_c - target_c) >= c_window).any(axis=(1, 2))
+
+        cd_t = cd[:, self.triggers, None]  # harmony errors in v1-trigger sequences (learner x trigger x 1)
+        strength_t = strength[:, self.triggers, None]
+        if self.fixed_point:
+            total = strength_v + strength_t
+            errors |= (np.abs(cd_v * strength_v + cd_t * strength_t - self.harmony_target * total) >=
+                       v_window * total).any(axis=(1, 2))
+        else:
+            output_v1 = ((cd_v * strength_v) + (cd_t * strength_t)) / (strength_v + strength_t)
+            errors |= (np.abs(output_v1 - self.harmony_target) >= v_window).any(axis=(1, 2))
+        converged[converged] = ~errors
+
+        return converged
+
+    def results(self):  # one summary dictionary per learner (same columns as ggla_batch results)
+
+        results = []
+        for learner in range(self.n_learners):
+            result = {'learner': learner, 'pattern': self.pattern_name, 'strength_min': self.strength_range[0],
+                      'strength_max': self.strength_range[1],
+                      'convergence_iteration': int(self.convergence_iteration[learner]), 'iterations': self.n_iter}
+            if result['convergence_iteration'] != -1:
+                result['iterations'] = result['convergence_iteration']
+            scale = 100 if self.fixed_point else 1  # (fixed-point parameters are in hundredths)
+            for s, members in enumerate(self.members):
+                for symbol in members:
+                    result[f'cd_{symbol}'] = self.cd[learner, s].item() / scale  # final learner constriction degree
+                    result[f'strength_{symbol}'] = self.strength[learner, s].item() / scale  # final learner strength
+            results.append(result)
+
+        return results
+
 
 ####################
 # HELPER FUNCTIONS #
@@ -461,6 +1570,51 @@ def plt_round(x):
         return math.ceil(x*mult) / mult
 
 
+def plot_windows(trajectories, start, stop, max_points=2000):
+    # iterations and values to plot of trajectories logged over the same iterations, which are read side by side one
+    # block at a time (so replayed trajectories are re-simulated once) and downsampled as each block arrives
+
+    every = trajectories[0].every
+    first = -(-start // every)  # first kept value at or after iteration start
+    last = min(-(-stop // every), len(trajectories[0]))  # first kept value at or after iteration stop
+    n = max(last - first, 0)
+    size = -(-n // (max_points // 2)) if n > max_points else 1  # values per bucket (1: no downsampling)
+    kept = [([], []) for _ in trajectories]  # positions and values kept of each trajectory
+    pending = [np.zeros(0) for _ in trajectories]  # values of each trajectory not yet in a whole bucket
+    position = first  # position of the first pending value
+
+    for blocks in zip(*(trajectory.blocks(first, last) for trajectory in trajectories)):
+        pending = [np.concatenate((values, block)) for values, block in zip(pending, blocks)]
+        whole = len(pending[0]) // size * size
+        for (positions, values), trajectory_values in zip(kept, pending):
+            keep_extremes(trajectory_values[:whole], position, size, positions, values)
+        pending = [values[whole:] for values in pending]
+        position += whole
+
+    for (positions, values), trajectory_values in zip(kept, pending):  # last bucket, which may be short
+        keep_extremes(trajectory_values, position, len(trajectory_values), positions, values)
+
+    return [(np.concatenate([np.zeros(0, dtype=int)] + positions) * every, np.concatenate([np.zeros(0)] + values))
+            for positions, values in kept]
+
+
+def keep_extremes(values, position, size, kept_positions, kept_values):
+    # keep the minimum and maximum of each bucket of size values (in order), so spikes and plateaus survive
+
+    if not len(values):
+        return
+
+    if size == 1:
+        keep = np.arange(len(values))
+    else:
+        buckets = values.reshape(-1, size)
+        starts = np.arange(len(buckets)) * size
+        keep = np.sort(np.stack([starts + buckets.argmin(axis=1), starts + buckets.argmax(axis=1)], axis=1),
+                       axis=1).ravel()
+    kept_positions.append(position + keep)
+    kept_values.append(values[keep])
+
+
 def blend(gest1, gest2, tract_var):  # blend gestures via average weighted by their strengths
     if tract_var == 'cd':  # if considering constriction degree, blend gestures' degrees
         return ((gest1.cd * gest1.strength) + (gest2.cd * gest2.strength)) / (gest1.strength + gest2.strength)
@@ -468,6 +1622,323 @@ def blend(gest1, gest2, tract_var):  # blend gestures via average weighted by th
         return ((gest1.cl * gest1.strength) + (gest2.cl * gest2.strength)) / (gest1.strength + gest2.strength)
 
 
+def expand_changes(start, changes, n_trials):  # rebuild a per-trial trajectory from a (trial, value) change log
+
+    trials, values = changes
+    boundaries = np.array([0] + [t - 1 for t in trials] + [n_trials])  # trial t is logged at position t - 1
+
+    return np.repeat(np.array([start] + values, dtype=float), np.diff(boundaries))
+
+
+def draw_trials(rng, n, n_vowels, n_consonants, vowel_class=None, lexicon=None):
+    # a block of n random trials for the array engine
+    # vowel_class: segment index of each vowel, if several vowels are trained as one segment
+    # lexicon: draw word shapes by their frequency in a Lexicon instead of uniformly
+
+    if lexicon is not None:
+        n_sylls, v1s, v2s, cs = lexicon.draw(rng, n)
+        n_sylls, cs = n_sylls.tolist(), cs.tolist()
+    else:
+        n_sylls = rng.integers(1, 3, n).tolist()  # one or two syllables
+        v1s = rng.integers(0, n_vowels, n)  # v1 index (ignored for monosyllables)
+        v2s = rng.integers(0, n_vowels, n)  # v2 index
+        cs = rng.integers(0, n_consonants, n).tolist()  # consonant index
+
+    if vowel_class is not None:
+        v1s, v2s = vowel_class[v1s], vowel_class[v2s]
+    v1s, v2s = v1s.tolist(), v2s.tolist()
+
+    return [n_sylls, v1s, v2s, cs]
+
+
+def run_trials(trials, cd, strength, inventory, rate, v_window, c_window, it=0, changes=None, table=None,
+               detector=None, telemetry=None, n_logged=0):
+    # run a block of training trials on flat lists of parameters (the array engine's trial loop, also used to replay)
+    # it: trials already run before this block, changes: (cd, strength) change logs to add (trial, value) to
+    # table, detector, telemetry: check for convergence and cycles and report progress (n_logged: earlier iterations)
+    # returns the number of trials run and why the block ended early ('converged', a cycle reason, or '')
+
+    cd_teacher = inventory['cd_teacher']
+    harmony_target = inventory['harmony_target']
+    trigger = inventory['trigger']
+    consonant_segment = inventory['consonant_segment']
+    cd_changes, strength_changes = changes if changes is not None else (None, None)
+    profile = telemetry is not None and telemetry.profile is not None
+
+    for n_syll, v1, v2, c in zip(*trials):
+
+        it += 1
+
+        v1_strength_update = 0
+        v2_strength_update = 0
+        c_strength_update = 0
+
+        v1_cd_update = 0
+        v2_cd_update = 0
+        c_cd_update = 0
+
+        c = consonant_segment[c]  # segment index of the consonant's TB gesture
+
+        # Consonant Blending with V2 (regardless of syllable count) #
+
+        if c >= 0:
+            target_c = cd_teacher[c]
+            output_c = ((cd[c] * strength[c]) + (cd[v2] * strength[v2])) / (strength[c] + strength[v2])
+
+            if output_c >= target_c + c_window:  # blended c is too open
+                v2_strength_update += -1 * rate
+                v2_cd_update += -1 * rate
+                c_strength_update += rate
+                c_cd_update += -1 * rate
+
+            elif output_c <= target_c - c_window:  # blended c is too closed
+                v2_strength_update += rate
+                v2_cd_update += rate
+                c_strength_update += -1 * rate
+                c_cd_update += rate
+
+        # V2 Target Learning (regardless of syllable count) #
+
+        target_v2 = cd_teacher[v2]
+        output_v2 = cd[v2]
+
+        if output_v2 >= target_v2 + v_window:  # learner v2 is too low
+            v2_cd_update += -1 * rate
+        elif output_v2 <= target_v2 - v_window:  # learner v2 is too high
+            v2_cd_update += rate
+
+        # Two Syllable Words #
+
+        if n_syll == 2:
+
+            if trigger[v2]:  # harmony: v1 blends with v2 and follows the pattern
+                target_v1 = harmony_target[v1]
+                output_v1 = ((cd[v1] * strength[v1]) + (cd[v2] * strength[v2])) / (strength[v1] + strength[v2])
+
+                if output_v1 >= target_v1 + v_window:  # blended v1 is too low
+                    v1_strength_update += -1 * rate
+                    v1_cd_update += -1 * rate
+                    v2_strength_update += rate
+                    v2_cd_update += -1 * rate
+
+                elif output_v1 <= target_v1 - v_window:  # blended v1 is too high
+                    v1_strength_update += rate
+                    v1_cd_update += rate
+                    v2_strength_update += -1 * rate
+                    v2_cd_update += rate
+
+            else:  # no harmony: v1 surfaces faithfully
+                target_v1 = cd_teacher[v1]
+                output_v1 = cd[v1]
+
+                if output_v1 >= target_v1 + v_window:  # learner v1 is too low
+                    v1_cd_update += -1 * rate
+                elif output_v1 <= target_v1 - v_window:  # learner v1 is too high
+                    v1_cd_update += rate
+
+        if profile:
+            telemetry.lap('blending')
+
+        # End of Training Trial - Do Gestural Parameter Updates (same order and rounding as Gesture) #
+
+        changed = []  # segments whose parameters changed this trial
+
+        updates = ((v1, v1_strength_update, v1_cd_update), (v2, v2_strength_update, v2_cd_update),
+                   (c, c_strength_update, c_cd_update)) if n_syll == 2 else \
+            ((v2, v2_strength_update, v2_cd_update), (c, c_strength_update, c_cd_update))
+
+        for s, s_update, cd_update in updates:
+            if s < 0:  # non-dorsal consonant
+                continue
+            if s_update and strength[s] + s_update >= 1:  # strength can't go below 1 (zero updates are no-ops)
+                new = round(strength[s] + s_update, 2)
+                if new != strength[s]:
+                    strength[s] = new
+                    if strength_changes is not None:
+                        strength_changes[s][0].append(it)
+                        strength_changes[s][1].append(new)
+                    changed.append(s)
+            if cd_update and cd[s] + cd_update >= -2:  # constriction degree can't go below -2
+                new = round(cd[s] + cd_update, 2)
+                if new != cd[s]:
+                    cd[s] = new
+                    if cd_changes is not None:
+                        cd_changes[s][0].append(it)
+                        cd_changes[s][1].append(new)
+                    changed.append(s)
+
+        if profile:
+            telemetry.lap('updates')
+
+        # End of Training Trial - Check for Convergence (only possible if something changed) #
+
+        if table is not None:
+            if changed:
+                table.update(changed)  # re-check only the constraints on the segments that changed
+                if table.converged():
+                    return it, 'converged'
+
+            if detector is not None:
+                stop_reason = detector.check(n_logged + it, table)
+                if stop_reason:
+                    return it, stop_reason
+
+        if profile:
+            telemetry.lap('convergence')
+
+        if telemetry is not None and it >= telemetry.next_report:
+            telemetry.report(it, n_logged + it, table)  # update progress bar and call back
+
+    return it, ''
+
+
+def run_trials_fixed(trials, cd, strength, inventory, rate, v_window, c_window, it=0, changes=None, table=None,
+                     detector=None, telemetry=None, n_logged=0):
+    # run_trials with parameters, rate and windows in integer hundredths: updates are integer additions (so there is
+    # nothing to round) and a blend is compared to a window by cross-multiplying instead of dividing, since
+    # (cd1 * s1 + cd2 * s2) / (s1 + s2) >= bound  <=>  cd1 * s1 + cd2 * s2 >= bound * (s1 + s2)  (strengths are > 0)
+
+    cd_teacher = inventory['cd_teacher']
+    harmony_target = inventory['harmony_target']
+    trigger = inventory['trigger']
+    consonant_segment = inventory['consonant_segment']
+    cd_changes, strength_changes = changes if changes is not None else (None, None)
+    profile = telemetry is not None and telemetry.profile is not None
+
+    for n_syll, v1, v2, c in zip(*trials):
+
+        it += 1
+
+        v1_strength_update = 0
+        v2_strength_update = 0
+        c_strength_update = 0
+
+        v1_cd_update = 0
+        v2_cd_update = 0
+        c_cd_update = 0
+
+        c = consonant_segment[c]  # segment index of the consonant's TB gesture
+
+        # Consonant Blending with V2 (regardless of syllable count) #
+
+        if c >= 0:
+            target_c = cd_teacher[c]
+            weighted_c = cd[c] * strength[c] + cd[v2] * strength[v2]  # blended c times total strength
+            total = strength[c] + strength[v2]
+
+            if weighted_c >= (target_c + c_window) * total:  # blended c is too open
+                v2_strength_update -= rate
+                v2_cd_update -= rate
+                c_strength_update += rate
+                c_cd_update -= rate
+
+            elif weighted_c <= (target_c - c_window) * total:  # blended c is too closed
+                v2_strength_update += rate
+                v2_cd_update += rate
+                c_strength_update -= rate
+                c_cd_update += rate
+
+        # V2 Target Learning (regardless of syllable count) #
+
+        target_v2 = cd_teacher[v2]
+        output_v2 = cd[v2]
+
+        if output_v2 >= target_v2 + v_window:  # learner v2 is too low
+            v2_cd_update -= rate
+        elif output_v2 <= target_v2 - v_window:  # learner v2 is too high
+            v2_cd_update += rate
+
+        # Two Syllable Words #
+
+        if n_syll == 2:
+
+            if trigger[v2]:  # harmony: v1 blends with v2 and follows the pattern
+                target_v1 = harmony_target[v1]
+                weighted_v1 = cd[v1] * strength[v1] + cd[v2] * strength[v2]  # blended v1 times total strength
+                total = strength[v1] + strength[v2]
+
+                if weighted_v1 >= (target_v1 + v_window) * total:  # blended v1 is too low
+                    v1_strength_update -= rate
+                    v1_cd_update -= rate
+                    v2_strength_update += rate
+                    v2_cd_update -= rate
+
+                elif weighted_v1 <= (target_v1 - v_window) * total:  # blended v1 is too high
+                    v1_strength_update += rate
+                    v1_cd_update += rate
+                    v2_strength_update -= rate
+                    v2_cd_update += rate
+
+            else:  # no harmony: v1 surfaces faithfully
+                target_v1 = cd_teacher[v1]
+                output_v1 = cd[v1]
+
+                if output_v1 >= target_v1 + v_window:  # learner v1 is too low
+                    v1_cd_update -= rate
+                elif output_v1 <= target_v1 - v_window:  # learner v1 is too high
+                    v1_cd_update += rate
+
+        if profile:
+            telemetry.lap('blending')
+
+        # End of Training Trial - Do Gestural Parameter Updates (v1, then v2, then c, like Gesture) #
+
+        changed = []  # segments whose parameters changed this trial
+
+        updates = ((v1, v1_strength_update, v1_cd_update), (v2, v2_strength_update, v2_cd_update),
+                   (c, c_strength_update, c_cd_update)) if n_syll == 2 else \
+            ((v2, v2_strength_update, v2_cd_update), (c, c_strength_update, c_cd_update))
+
+        for s, s_update, cd_update in updates:
+            if s < 0:  # non-dorsal consonant
+                continue
+            if s_update and strength[s] + s_update >= 100:  # strength can't go below 1
+                strength[s] += s_update
+                if strength_changes is not None:
+                    strength_changes[s][0].append(it)
+                    strength_changes[s][1].append(strength[s])
+                changed.append(s)
+            if cd_update and cd[s] + cd_update >= -200:  # constriction degree can't go below -2
+                cd[s] += cd_update
+                if cd_changes is not None:
+                    cd_changes[s][0].append(it)
+                    cd_changes[s][1].append(cd[s])
+                changed.append(s)
+
+        if profile:
+            telemetry.lap('updates')
+
+        # End of Training Trial - Check for Convergence (only possible if something changed) #
+
+        if table is not None:
+            if changed:
+                table.update(changed)  # re-check only the constraints on the segments that changed
+                if table.converged():
+                    return it, 'converged'
+
+            if detector is not None:
+                stop_reason = detector.check(n_logged + it, table)
+                if stop_reason:
+                    return it, stop_reason
+
+        if profile:
+            telemetry.lap('convergence')
+
+        if telemetry is not None and it >= telemetry.next_report:
+            telemetry.report(it, n_logged + it, table)  # update progress bar and call back
+
+    return it, ''
+
+
+def hundredths(value):  # a value (or array of values) with at most 2 decimals as integer hundredths
+
+    scaled = np.rint(np.asarray(value, dtype=float) * 100)
+    if np.any(np.abs(scaled - np.asarray(value, dtype=float) * 100) > 1e-6):
+        raise ValueError(f'{value} is not a whole number of hundredths, so it has no fixed-point representation.')
+
+    return scaled.astype(np.int64) if scaled.ndim else int(scaled)
+
+
 def json2gest(json_dict):  # parse a .json dictionary into a Gesture object
 
     gesture = Gesture(None, None)
@@ -476,13 +1947,98 @@ def json2gest(json_dict):  # parse a .json dictionary into a Gesture object
     gesture.cl_list = json_dict['cl_list']
     gesture.cd = json_dict['cd']
     gesture.cd_teacher = json_dict['cd_teacher']
-    gesture.cd_list = json_dict['cd_list']
+    gesture.cd_list = json2traj(json_dict['cd_list'])
     gesture.strength = json_dict['strength']
-    gesture.strength_list = json_dict['strength_list']
+    gesture.strength_list = json2traj(json_dict['strength_list'])
 
     return gesture
 
 
+def json2traj(json_data):  # parse a .json list or dictionary into a Trajectory object
+
+    if isinstance(json_data, list):  # a plain list of every iteration's value
+        trajectory = Trajectory()
+        trajectory.extend(json_data)
+    elif json_data.get('replay'):  # re-simulated from the model's checkpoints (linked by Language.set_replay)
+        trajectory = ReplayTrajectory()
+        trajectory.n_logged = json_data['n_logged']
+    else:  # a decimated and/or run-length encoded trajectory (arrays already read if from a binary model)
+        trajectory = Trajectory(json_data['every'], json_data['runs'])
+        trajectory.n_logged = json_data['n_logged']
+        for attrib, key in [('hundredths', 'values'), ('run_lengths', 'lengths')]:
+            if isinstance(json_data[key], (array, np.ndarray)):
+                setattr(trajectory, attrib, json_data[key])
+            else:
+                setattr(trajectory, attrib, array('i', json_data[key]))
+
+    return trajectory
+
+
+def write_model(filename, model_dict, arrays):  # save a model as a json header followed by raw arrays
+    # (written to a temporary file first, so a model can be re-saved over a file its trajectories are mapped from)
+
+    # .ggla layout: magic line, 8-byte header length, json header, then each array 64-byte aligned
+    offsets = []
+    offset = 0
+    for data in arrays:
+        offsets.append(offset)
+        offset += -(-len(data) * data.itemsize // 64) * 64
+
+    header = json.dumps({'model': model_dict,
+                         'arrays': [{'dtype': np.dtype(np.intc).str, 'offset': offset, 'count': len(data)}
+                                    for data, offset in zip(arrays, offsets)]}).encode('utf-8')
+
+    with open(filename + '.tmp', 'wb') as model_file:
+        model_file.write(b'GGLA1\n')
+        model_file.write(len(header).to_bytes(8, 'little'))
+        model_file.write(header)
+        model_file.write(bytes(-model_file.tell() % 64))  # pad to the start of the array data
+        for data in arrays:
+            model_file.write(data)  # written straight from the array's buffer (no copy)
+            model_file.write(bytes(-len(data) * data.itemsize % 64))
+
+    os.replace(filename + '.tmp', filename)
+
+
+def read_model(filename, lazy=False):  # load a .ggla model as a dictionary, with arrays in place of references
+    # (if lazy, the arrays are read-only memory maps, so only the parts of them that are used are ever read)
+
+    with open(filename, 'rb') as model_file:
+        if model_file.readline() != b'GGLA1\n':
+            raise ValueError(f'{filename} is not a .ggla model file.')
+        header = json.loads(model_file.read(int.from_bytes(model_file.read(8), 'little')).decode('utf-8'))
+        data_start = model_file.tell() + -model_file.tell() % 64
+
+        if any(spec['dtype'] != np.dtype(np.intc).str for spec in header['arrays']):
+            raise ValueError(f'{filename} was saved on a platform with a different integer format.')
+
+        if lazy:
+            size = os.path.getsize(filename) - data_start
+            data = np.memmap(filename, dtype=np.intc, mode='r', offset=data_start) if size else np.zeros(0, np.intc)
+            arrays = [data[spec['offset'] // data.itemsize:spec['offset'] // data.itemsize + spec['count']]
+                      for spec in header['arrays']]
+            return resolve_arrays(header['model'], arrays)
+
+        arrays = []
+        for spec in header['arrays']:
+            data = array('i')
+            model_file.seek(data_start + spec['offset'])
+            data.frombytes(model_file.read(spec['count'] * data.itemsize))
+            arrays.append(data)
+
+    return resolve_arrays(header['model'], arrays)
+
+
+def resolve_arrays(item, arrays):  # replace every {'array': n} reference in a model dictionary with arrays[n]
+
+    if isinstance(item, dict):
+        if list(item) == ['array']:
+            return arrays[item['array']]
+        return {key: resolve_arrays(value, arrays) for key, value in item.items()}
+
+    return item
+
+
 def json2seg(json_dict):  # parse a .json dictionary into a Segment object
 
     segment = Segment(json_dict['symbol'],
@@ -495,3 +2051,32 @@ def json2seg(json_dict):  # parse a .json dictionary into a Segment object
                       json_dict['glottis_gest'])
 
     return segment
+
+
+def alias_table(weights):  # Vose's alias method: tables from which a weighted choice takes one uniform draw and a coin
+
+    n = len(weights)
+    scaled = np.asarray(weights, dtype=float) * n / sum(weights)  # mean 1
+    prob = np.ones(n)
+    alias = np.arange(n)
+    small = [i for i in range(n) if scaled[i] < 1]
+    large = [i for i in range(n) if scaled[i] >= 1]
+
+    while small and large:  # pair each outcome below the mean with one above it, which fills the rest of its column
+        i = small.pop()
+        j = large.pop()
+        prob[i] = scaled[i]
+        alias[i] = j
+        scaled[j] -= 1 - scaled[i]
+        (small if scaled[j] < 1 else large).append(j)
+
+    return prob, alias  # (outcomes left over, from rounding, keep their whole column)
+
+
+def read_lexicon(filename):  # [consonant, v1, v2, count] word shapes from a tab-delimited frequency file
+
+    with open(filename, newline='', encoding='utf-8') as lexicon_file:
+        reader = csv.DictReader(lexicon_file, delimiter='\t')
+        if not reader.fieldnames or not {'c', 'v1', 'v2', 'count'} <= set(reader.fieldnames):
+            raise ValueError(f'{filename} needs c, v1, v2 and count columns')
+        return [[row['c'], row['v1'] or '', row['v2'], float(row['count'])] for row in reader]
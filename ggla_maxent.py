@@ -0,0 +1,251 @@
+import argparse
+import os
+import numpy as np
+from tqdm import tqdm
+from ggla_batch import write_results
+
+TARGETS = {'stepwise': {'i-i': 'i-i', 'e-i': 'i-i', 'eh-i': 'e-i', 'a-i': 'eh-i'},  # four-tier height harmony
+           'saltation': {'i-i': 'i-i', 'e-i': 'e-i', 'eh-i': 'i-i', 'a-i': 'e-i'}}  # (as in the alternatives logs)
+
+
+class Tableaux:  # tab-delimited Soft Typology Tool tableaux as dense violation arrays
+
+    def __init__(self, filename, cons=''):
+        self.filename = filename
+        self.inputs = []  # underlying forms, in file order
+        self.candidates = []  # candidate outputs of each input
+        rows = {}  # violations of each input's candidates
+        observed = {}  # candidate of each input marked in the O column
+
+        with open(filename, encoding='utf-8') as tableau_file:
+            header = tableau_file.readline().rstrip('\n').split('\t')
+            self.constraints = header[3:]
+            for line in tableau_file:
+                if not line.strip():
+                    continue
+                form, output, o, *violations = line.rstrip('\n').split('\t')
+                if form not in rows:
+                    self.inputs.append(form)
+                    self.candidates.append([])
+                    rows[form] = []
+                if float(o or 0) != 0:
+                    observed[form] = output
+                self.candidates[self.inputs.index(form)].append(output)
+                rows[form].append([float(v or 0) for v in violations])
+
+        # input x candidate x constraint violations (0 for the padding of inputs with fewer candidates)
+        n_candidates = max(len(candidates) for candidates in self.candidates)
+        self.violations = np.zeros((len(self.inputs), n_candidates, len(self.constraints)))
+        self.valid = np.zeros((len(self.inputs), n_candidates), dtype=bool)  # real candidates (not padding)
+        for i, form in enumerate(self.inputs):
+            self.violations[i, :len(rows[form])] = rows[form]
+            self.valid[i, :len(rows[form])] = True
+        self.n_valid = self.valid.sum(axis=1)
+        self.observed = observed
+
+        # initial weights from the matching -cons file (Var and Weights rows), if there is one
+        if not cons:
+            cons = os.path.splitext(filename)[0] + '-cons.txt'
+        self.weights = np.zeros(len(self.constraints))
+        if os.path.isfile(cons):
+            with open(cons, encoding='utf-8') as cons_file:
+                names = cons_file.readline().rstrip('\n').split('\t')[1:]
+                weights = cons_file.readline().rstrip('\n').split('\t')[1:]
+            initial = dict(zip(names, weights))
+            for k, constraint in enumerate(self.constraints):
+                if constraint not in initial:
+                    raise ValueError(f'{cons} has no weight for {constraint}')
+                self.weights[k] = float(initial[constraint])
+
+    def target(self, pattern=None):  # winning candidate of each input (default: those marked in the O column)
+
+        if pattern is None:
+            pattern = self.observed
+        elif isinstance(pattern, str):
+            pattern = TARGETS[pattern]
+
+        target = np.zeros(len(self.inputs), dtype=int)
+        for i, form in enumerate(self.inputs):
+            if pattern.get(form) not in self.candidates[i]:
+                raise ValueError(f'no target candidate for /{form}/')
+            target[i] = self.candidates[i].index(pattern[form])
+
+        return target
+
+    def harmony(self, weights):  # harmony of every candidate, for weights of shape (..., constraints)
+        return np.where(self.valid, np.einsum('ick,...k->...ic', self.violations, weights), -np.inf)
+
+    def probabilities(self, weights):  # MaxEnt probability of every candidate, for weights of shape (..., constraints)
+
+        harmony = self.harmony(weights)
+        exp = np.exp(harmony - harmony.max(axis=-1, keepdims=True))
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class MaxEntEnsemble:  # many independent generational MaxEnt HG runs, trained in lockstep as one set of arrays
+
+    def __init__(self, tableaux, n_runs=100, target=None, seed=None):
+        self.tableaux = tableaux if isinstance(tableaux, Tableaux) else Tableaux(tableaux)
+        self.target = self.tableaux.target(target)  # candidate index each input should map to
+        self.n_runs = n_runs
+        self.rng = np.random.default_rng(seed)  # draws every run's training data and outputs
+
+        self.weights = np.tile(self.tableaux.weights, (n_runs, 1))  # run x constraint weights
+        self.generation_probs = []  # per generation: run x input probability of the target at its end
+        self.iteration_probs = []  # per generation: log x run x input probability of the target
+        self.weight_log = []  # per generation: log x run x constraint weights
+        self.log_every = 0
+
+    def train(self, generations=20, iterations=2000, rate=0.05, log_every=100):
+        # each generation starts from the initial weights and learns from samples of the previous generation's
+        # grammar (the first learns from the target pattern itself), one trial per run per iteration
+
+        tableaux = self.tableaux
+        violations = tableaux.violations
+        valid = tableaux.valid
+        n_valid = tableaux.n_valid
+        n_inputs = len(tableaux.inputs)
+        runs = np.arange(self.n_runs)
+        self.log_every = log_every
+
+        teacher = np.zeros((self.n_runs, n_inputs, violations.shape[1]))  # teacher's probability of each candidate
+        teacher[:, np.arange(n_inputs), self.target] = 1
+
+        for _ in tqdm(range(generations)):
+
+            weights = np.tile(tableaux.weights, (self.n_runs, 1))
+            teacher_cum = np.cumsum(teacher, axis=-1)
+            iteration_probs = [self.target_probabilities(weights)]
+            weight_log = [weights.copy()]
+
+            for start in range(0, iterations, log_every):
+
+                # Draw a Block of Training Data and Sampling Noise for Every Run #
+
+                n_block = min(log_every, iterations - start)
+                inputs = self.rng.integers(0, n_inputs, (n_block, self.n_runs))
+                teacher_draws = self.rng.random((n_block, self.n_runs))
+                learner_draws = self.rng.random((n_block, self.n_runs))
+
+                for t in range(n_block):
+
+                    form = inputs[t]
+                    cands = violations[form]  # run x candidate x constraint
+
+                    # teacher's output: sampled from its distribution (inverse CDF, clipped to real candidates)
+                    heard = (teacher_cum[runs, form] <= teacher_draws[t, :, None]).sum(axis=1)
+                    heard = np.minimum(heard, n_valid[form] - 1)
+
+                    # learner's output: sampled from its current MaxEnt distribution
+                    harmony = np.einsum('rck,rk->rc', cands, weights)
+                    harmony = np.where(valid[form], harmony - harmony.max(axis=1, keepdims=True), -np.inf)
+                    cum = np.cumsum(np.exp(harmony), axis=1)
+                    produced = (cum <= learner_draws[t, :, None] * cum[:, -1:]).sum(axis=1)
+                    produced = np.minimum(produced, n_valid[form] - 1)
+
+                    # perceptron-style update toward the teacher's output (no update where they match), weights >= 0
+                    weights += rate * (cands[runs, heard] - cands[runs, produced])
+                    np.maximum(weights, 0, out=weights)
+
+                iteration_probs.append(self.target_probabilities(weights))
+                weight_log.append(weights.copy())
+
+            self.weights = weights
+            self.generation_probs.append(iteration_probs[-1])
+            self.iteration_probs.append(np.array(iteration_probs))
+            self.weight_log.append(np.array(weight_log))
+            teacher = tableaux.probabilities(weights)  # this generation teaches the next
+
+        return self.stable()
+
+    def target_probabilities(self, weights):  # run x input probability of each input's target candidate
+        return self.tableaux.probabilities(weights)[:, np.arange(len(self.tableaux.inputs)), self.target]
+
+    def stable(self):  # runs whose final weights make every target the unique highest-harmony candidate (in HG)
+
+        harmony = self.tableaux.harmony(self.weights)
+        n_inputs = len(self.tableaux.inputs)
+        target_harmony = harmony[:, np.arange(n_inputs), self.target]
+        harmony[:, np.arange(n_inputs), self.target] = -np.inf
+        return (target_harmony > harmony.max(axis=2)).all(axis=1)
+
+    def results(self):  # one summary dictionary per run
+
+        stable = self.stable()
+        forms = self.forms()
+        results = []
+        for run in range(self.n_runs):
+            result = {'run': run, 'tableaux': self.tableaux.filename, 'generations': len(self.generation_probs),
+                      'stable': bool(stable[run])}
+            for i, form in enumerate(forms):
+                result[f'p({form})'] = float(self.generation_probs[-1][run, i])  # final probability of each target
+            for k, constraint in enumerate(self.tableaux.constraints):
+                result[f'w({constraint})'] = round(float(self.weights[run, k]), 10)  # final weight of each constraint
+            results.append(result)
+
+        return results
+
+    def forms(self):  # target mappings as named in the Soft Typology Tool logs
+        candidates = self.tableaux.candidates
+        return [f'{form} -> {candidates[i][self.target[i]]}' for i, form in enumerate(self.tableaux.inputs)]
+
+    def write_logs(self, directory, run=0, name='run'):
+        # one run's logs in the layout of the alternatives directory: generation/NAME.txt (target probabilities at
+        # the end of each generation), iteration/NAME-gen-N.txt (target probabilities every log_every iterations)
+        # and weight/NAME-gen-N.txt (constraint weights every log_every iterations)
+
+        for subdirectory in ['generation', 'iteration', 'weight']:
+            os.makedirs(os.path.join(directory, subdirectory), exist_ok=True)
+        forms = self.forms()
+
+        with open(os.path.join(directory, 'generation', f'{name}.txt'), 'w', encoding='utf-8') as log_file:
+            log_file.write('\t'.join(['Forms'] + [f'Gen-{g}' for g in range(len(self.generation_probs))]))
+            for i, form in enumerate(forms):
+                log_file.write('\n' + '\t'.join([form] + [str(probs[run, i]) for probs in self.generation_probs]))
+
+        for g, (iteration_probs, weight_log) in enumerate(zip(self.iteration_probs, self.weight_log)):
+            with open(os.path.join(directory, 'iteration', f'{name}-gen-{g}.txt'), 'w', encoding='utf-8') as log_file:
+                log_file.write('\t'.join(['Forms'] + [f'Iter-{n}' for n in range(len(iteration_probs))]))
+                for i, form in enumerate(forms):
+                    log_file.write('\n' + '\t'.join([form] + [str(probs[run, i]) for probs in iteration_probs]))
+            with open(os.path.join(directory, 'weight', f'{name}-gen-{g}.txt'), 'w', encoding='utf-8') as log_file:
+                log_file.write('\t'.join(f'Iter-{n}' for n in range(len(weight_log))))  # (no label, as in the tool)
+                for k, constraint in enumerate(self.tableaux.constraints):
+                    log_file.write('\n' + '\t'.join([constraint] + [str(round(w, 10)) for w in weight_log[:, run, k]]))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Generational MaxEnt HG learning of Soft Typology Tool tableaux.')
+    parser.add_argument('tableaux', help='tableaux .txt file (initial weights are read from its -cons.txt file)')
+    parser.add_argument('--cons', default='', help='initial weights file (default: the tableaux file\'s -cons.txt)')
+    parser.add_argument('--target', choices=list(TARGETS) + ['observed'], default='observed',
+                        help='target pattern (default: the candidates marked in the O column)')
+    parser.add_argument('--runs', type=int, default=100, help='independent runs (default 100)')
+    parser.add_argument('--generations', type=int, default=20, help='generations per run (default 20)')
+    parser.add_argument('--iterations', type=int, default=2000, help='iterations per generation (default 2000)')
+    parser.add_argument('--rate', type=float, default=0.05, help='learning rate (default 0.05)')
+    parser.add_argument('--log-every', type=int, default=100, help='iterations between logged values (default 100)')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    parser.add_argument('--logs', default='', help='write logs of the first stable and unstable runs to this directory')
+    parser.add_argument('--output', default='', help='save a summary of every run as a tab-delimited table')
+    args = parser.parse_args()
+
+    ensemble = MaxEntEnsemble(Tableaux(args.tableaux, args.cons), args.runs,
+                              None if args.target == 'observed' else args.target, args.seed)
+    stable = ensemble.train(args.generations, args.iterations, args.rate, args.log_every)
+    print(f'{stable.sum()} of {args.runs} runs stable ({stable.mean():.0%}) after {args.generations} generations.')
+
+    if args.logs:
+        for name, runs in [('stablerun', np.flatnonzero(stable)), ('unstablerun', np.flatnonzero(~stable))]:
+            if len(runs):
+                ensemble.write_logs(args.logs, runs[0], name)
+        print(f'Logs saved in {args.logs}.')
+
+    if args.output:
+        write_results(ensemble.results(), args.output)
+        print(f'Summary saved as {args.output}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+import argparse
+import hashlib
+import json
+import math
+from multiprocessing import Pool
+import os
+import sqlite3
+from statistics import NormalDist
+import numpy as np
+from ggla_batch import make_jobs, run_job, write_results
+
+KEY = ['pattern_hash', 'rate', 'v_window', 'c_window', 'strength_min', 'strength_max', 'seed', 'engine',
+       'cycle_check', 'patience', 'code_version']  # everything a run's result depends on
+CELL = ['pattern', 'rate', 'v_window', 'c_window', 'strength_min', 'strength_max', 'engine', 'cycle_check',
+        'patience']  # runs that differ only by seed
+
+
+def file_hash(filename):  # short hash of a file's contents
+
+    with open(filename, 'rb') as hashed_file:
+        return hashlib.sha256(hashed_file.read()).hexdigest()[:16]
+
+
+def code_version():  # hash of the code that trains learners, so results from older code are never reused
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return hashlib.sha256(''.join(file_hash(os.path.join(directory, module))
+                                  for module in ['ggla_height_harmony.py', 'ggla_batch.py']).encode()).hexdigest()[:16]
+
+
+class SweepCache:  # completed runs stored in an SQLite file, keyed by pattern, hyperparameters, seed and code version
+
+    def __init__(self, filename='ggla_sweep.sqlite'):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute(f'''CREATE TABLE IF NOT EXISTS runs (
+                                    pattern_hash TEXT, pattern TEXT, rate REAL, v_window REAL, c_window REAL,
+                                    strength_min INTEGER, strength_max INTEGER, seed INTEGER, engine TEXT,
+                                    cycle_check INTEGER, patience INTEGER, code_version TEXT,
+                                    convergence_iteration INTEGER, cycle_iteration INTEGER, iterations INTEGER,
+                                    result TEXT, PRIMARY KEY ({', '.join(KEY)}))''')
+        self.connection.commit()
+
+    def has(self, job):  # whether a job's result is already stored
+        return self.connection.execute(f'SELECT 1 FROM runs WHERE {" AND ".join(k + " = ?" for k in KEY)}',
+                                       [job[k] for k in KEY]).fetchone() is not None
+
+    def add(self, result):  # store one completed run (replacing any earlier copy)
+
+        columns = KEY + ['pattern', 'convergence_iteration', 'cycle_iteration', 'iterations', 'result']
+        row = dict(result, result=json.dumps(result))
+        self.connection.execute(f'INSERT OR REPLACE INTO runs ({", ".join(columns)}) '
+                                f'VALUES ({", ".join("?" for _ in columns)})', [row[c] for c in columns])
+        self.connection.commit()
+
+    def results(self, code=None, patterns=None):  # stored runs (by default, only those from the current code)
+
+        query = 'SELECT result FROM runs WHERE code_version = ?'
+        arguments = [code or code_version()]
+        if patterns:
+            query += f' AND pattern_hash IN ({", ".join("?" for _ in patterns)})'
+            arguments += [file_hash(pattern) for pattern in patterns]
+
+        return [json.loads(row[0]) for row in self.connection.execute(query + ' ORDER BY rowid', arguments)]
+
+    def close(self):
+        self.connection.close()
+
+
+def run_jobs(jobs, sweep_cache, processes=None):  # results of jobs (as in ggla_batch.make_jobs), training only
+    # those that aren't cached yet
+
+    version = code_version()
+    hashes = {}
+    for job in jobs:
+        if job['pattern'] not in hashes:
+            hashes[job['pattern']] = file_hash(job['pattern'])
+        job.update({'pattern_hash': hashes[job['pattern']], 'code_version': version})
+
+    missing = [job for job in jobs if not sweep_cache.has(job)]
+    print(f'{len(jobs) - len(missing)} of {len(jobs)} runs cached, running {len(missing)}.')
+
+    if missing:
+        with Pool(processes) as pool:
+            for result in pool.imap_unordered(run_job, missing):
+                sweep_cache.add(result)  # stored as soon as it's done, so an interrupted sweep loses nothing
+
+    jobs = {tuple(job[k] for k in KEY): job for job in jobs}
+    results = []
+    for result in sweep_cache.results(version, list(hashes)):  # keep only these runs, in job order
+        job = jobs.get(tuple(result[k] for k in KEY))
+        if job is not None:
+            results.append(dict(result, job=job['job'], pattern=job['pattern']))  # (pattern as named in the jobs)
+    results.sort(key=lambda result: result['job'])
+
+    return results
+
+
+def sweep(spec, cache='ggla_sweep.sqlite', processes=None):
+    # train every job in a spec (as in ggla_batch.make_jobs) that isn't cached yet, and return every job's result
+
+    sweep_cache = SweepCache(cache)
+    results = run_jobs(make_jobs(spec), sweep_cache, processes)
+    sweep_cache.close()
+
+    return results
+
+
+def adaptive_sweep(spec, cache='ggla_sweep.sqlite', processes=None, batch_size=20, max_seeds=1000,
+                   rate_precision=0.05, iteration_precision=0.1, quantiles=(0.5,), confidence=0.95):
+    # train each cell of a spec (its seeds are ignored) a batch of seeds at a time, until the confidence intervals
+    # of its convergence rate (half-width at most rate_precision) and of its iteration quantiles (half-width at most
+    # iteration_precision times the estimate) are tight enough, or it has run max_seeds seeds
+
+    cells = make_jobs(dict(spec, seeds=[0]))  # one job per cell, as a template for its seeds
+    n_seeds = [0] * len(cells)  # seeds run so far in each cell (seeds 0, 1, 2..., as in sweep)
+    done = [''] * len(cells)  # why each cell stopped ('' while it is still sampled)
+    results = []  # every run so far
+
+    sweep_cache = SweepCache(cache)
+    while not all(done):
+
+        jobs = []
+        for c, cell in enumerate(cells):
+            if not done[c]:
+                seeds = range(n_seeds[c], min(n_seeds[c] + batch_size, max_seeds))
+                jobs += [dict(cell, seed=seed) for seed in seeds]
+                n_seeds[c] = seeds.stop
+        for j, job in enumerate(jobs):
+            job['job'] = len(results) + j  # numbered in the order they were scheduled
+        results += run_jobs(jobs, sweep_cache, processes)
+
+        summary = summarize(results, quantiles, confidence)
+        for c, cell in enumerate(cells):
+            if done[c]:
+                continue
+            estimates = next(row for row in summary if all(row[k] == cell[k] for k in CELL))
+            if precise(estimates, rate_precision, iteration_precision, quantiles):
+                done[c] = 'precise'
+            elif n_seeds[c] >= max_seeds:
+                done[c] = 'max_seeds'
+        print(f'{done.count("")} of {len(cells)} cells still sampling.')
+
+    sweep_cache.close()
+
+    return results
+
+
+def precise(estimates, rate_precision=0.05, iteration_precision=0.1, quantiles=(0.5,)):
+    # whether a cell's summary meets its target precision (iteration quantiles only count if any run converged)
+
+    if (estimates['rate_high'] - estimates['rate_low']) / 2 > rate_precision:
+        return False
+    if not estimates['converged']:
+        return True
+    for q in quantiles:
+        estimate, low, high = (estimates[f'p{q * 100:g}_{statistic}'] for statistic in ['iterations', 'low', 'high'])
+        if low is None or high is None or (high - low) / 2 > iteration_precision * estimate:
+            return False
+
+    return True
+
+
+def summarize(results, quantiles=(0.5,), confidence=0.95):
+    # convergence rate and iterations of each cell (hyperparameter combination) of a sweep, with confidence intervals:
+    # Wilson score intervals for the convergence rate, and order-statistic intervals for quantiles of the iterations
+    # taken by learners that converged (None where there are too few runs for one)
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    cells = {}
+    for result in results:
+        cells.setdefault(tuple(result[k] for k in CELL), []).append(result)
+
+    summary = []
+    for cell, runs in cells.items():
+        converged = sorted(run['convergence_iteration'] for run in runs if run['convergence_iteration'] != -1)
+        n, k = len(runs), len(converged)
+        rate = k / n
+        centre = (rate + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+        half_width = z * math.sqrt(rate * (1 - rate) / n + z ** 2 / (4 * n ** 2)) / (1 + z ** 2 / n)
+        row = dict(zip(CELL, cell), runs=n, converged=k, convergence_rate=rate,
+                   rate_low=max(0.0, centre - half_width), rate_high=min(1.0, centre + half_width),
+                   median_iterations=float(np.median(converged)) if converged else None,
+                   mean_iterations=float(np.mean(converged)) if converged else None)
+
+        for q in quantiles:
+            spread = z * math.sqrt(k * q * (1 - q))
+            low, high = math.floor(k * q - spread), math.ceil(k * q + spread)  # 0-based ranks bounding the quantile
+            row[f'p{q * 100:g}_iterations'] = float(np.quantile(converged, q)) if converged else None
+            row[f'p{q * 100:g}_low'] = float(converged[low]) if converged and low >= 0 else None
+            row[f'p{q * 100:g}_high'] = float(converged[high]) if converged and high < k else None
+        summary.append(row)
+
+    return summary
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Sweep GGLA height harmony hyperparameters, reusing cached runs.')
+    parser.add_argument('patterns', nargs='+', help='pattern .json files')
+    parser.add_argument('--seeds', type=int, default=100, help='number of seeds per cell (default 100)')
+    parser.add_argument('--rate', type=float, nargs='+', default=[0.1], help='learning rate(s)')
+    parser.add_argument('--v-window', type=float, nargs='+', default=[0.2], help='vowel error window(s)')
+    parser.add_argument('--c-window', type=float, nargs='+', default=[1], help='consonant error window(s)')
+    parser.add_argument('--strength-range', nargs='+', default=['1-20'],
+                        help='initial strength range(s), as lowest-highest (default 1-20)')
+    parser.add_argument('--cycle-check', type=int, default=0, help='stop learners whose state repeats (default off)')
+    parser.add_argument('--patience', type=int, default=0,
+                        help='stop learners whose errors have not gone down for this many iterations (default off)')
+    parser.add_argument('--engine', choices=['array', 'python'], default='array', help='training engine')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--cache', default='ggla_sweep.sqlite', help='results cache filename')
+    parser.add_argument('--output', default='', help='save the summary as a tab-delimited table')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='run seeds in batches until each cell\'s estimates are precise (instead of --seeds)')
+    parser.add_argument('--batch-size', type=int, default=20, help='seeds per cell per batch (default 20)')
+    parser.add_argument('--max-seeds', type=int, default=1000, help='most seeds per cell (default 1000)')
+    parser.add_argument('--rate-precision', type=float, default=0.05,
+                        help='target half-width of the convergence rate interval (default 0.05)')
+    parser.add_argument('--iteration-precision', type=float, default=0.1,
+                        help='target half-width of the iteration quantile intervals, relative (default 0.1)')
+    parser.add_argument('--quantiles', type=float, nargs='+', default=[0.5],
+                        help='iteration quantiles to estimate (default 0.5)')
+    parser.add_argument('--confidence', type=float, default=0.95, help='confidence level (default 0.95)')
+    args = parser.parse_args()
+
+    spec = {'patterns': args.patterns, 'seeds': args.seeds, 'rate': args.rate, 'v_window': args.v_window,
+            'c_window': args.c_window, 'engine': args.engine, 'cycle_check': args.cycle_check,
+            'patience': args.patience,
+            'strength_range': [tuple(int(x) for x in strength_range.split('-')) for strength_range in
+                               args.strength_range]}
+
+    if args.adaptive:
+        results = adaptive_sweep(spec, args.cache, args.processes, args.batch_size, args.max_seeds,
+                                 args.rate_precision, args.iteration_precision, args.quantiles, args.confidence)
+    else:
+        results = sweep(spec, args.cache, args.processes)
+    summary = summarize(results, args.quantiles, args.confidence)
+
+    for cell in summary:
+        median = f'{cell["median_iterations"]:.0f}' if cell['median_iterations'] is not None else '-'
+        print(f'{os.path.basename(cell["pattern"]):<20} rate {cell["rate"]:<6} v {cell["v_window"]:<5} '
+              f'c {cell["c_window"]:<5} strengths {cell["strength_min"]}-{cell["strength_max"]:<4} '
+              f'converged {cell["converged"]}/{cell["runs"]} ({cell["rate_low"]:.2f}-{cell["rate_high"]:.2f})  '
+              f'median {median}')
+
+    if args.output:
+        write_results(summary, args.output)
+        print(f'Summary saved as {args.output}.')
+
+
+if __name__ == '__main__':
+    main()